@@ -1,16 +1,30 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import hmac
+import io
+import json
 import os
-from datetime import date
+import threading
+import time
+import uuid
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from datetime import date, timedelta
 
 import streamlit as st
 import pandas as pd
 
 from sqlalchemy import (
-    create_engine, Column, Integer, String, Text, text
+    create_engine, Column, Date, Integer, String, Text, func, text
 )
 from sqlalchemy.orm import declarative_base, sessionmaker
 from urllib.parse import quote_plus
 
+from backup import BackupError, create_backup, list_backups, restore_backup
+import purchase_order
+from search_index import rebuild_search_index
+
 # =========================================================
 # 페이지 설정
 # =========================================================
@@ -46,22 +60,109 @@ def _login_form():
         else:
             st.error("❌ 비밀번호가 올바르지 않습니다.")
 
-if not st.session_state.authenticated:
-    _login_form()
-    st.stop()
-
 # ==========================
 # DB 연결
 #  - Supabase(Session pooler 6543) 권장
 #  - Secrets에 값이 없으면 SQLite로 로컬 폴백
+#  - 연결 실패는 차단기(circuit breaker)가 cooldown 동안 기억 → rerun이 매번 기다리지 않음
 # ==========================
 from urllib.parse import quote_plus  # ← 꼭 추가
 
+DB_CONNECT_TIMEOUT = int(st.secrets.get("DB_CONNECT_TIMEOUT", 5))      # 초
+DB_BREAKER_COOLDOWN = int(st.secrets.get("DB_BREAKER_COOLDOWN", 60))    # 초
+
+def _short_error(e: Exception) -> str:
+    msg = str(e).strip()
+    return msg.splitlines()[0][:200] if msg else type(e).__name__
+
+class CircuitBreaker:
+    """Postgres 연결 차단기 (모든 세션 공유)
+
+    - closed: 정상 연결
+    - open: 최근 실패를 기억 → cooldown 동안 rerun은 연결 시도 없이 바로 SQLite 사용
+    - half_open: 백그라운드 스레드가 복구 여부 확인 중 (rerun은 계속 건너뜀)
+    """
+
+    def __init__(self, cooldown: float):
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error = ""
+        self._lock = threading.Lock()
+        self._probe = None
+
+    def allow(self) -> bool:
+        with self._lock:
+            return self.state == "closed"
+
+    def remaining(self) -> float:
+        with self._lock:
+            return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures, self.last_error = "closed", 0, ""
+
+    def record_failure(self, err: Exception, probe):
+        with self._lock:
+            self.state = "open"
+            self.failures += 1
+            self.opened_at = time.monotonic()
+            self.last_error = _short_error(err)
+            if self._probe is None or not self._probe.is_alive():
+                self._probe = threading.Thread(target=self._probe_loop, args=(probe,), daemon=True)
+                self._probe.start()
+
+    def _probe_loop(self, probe):
+        while True:
+            time.sleep(self.remaining())
+            with self._lock:
+                self.state = "half_open"
+            try:
+                probe()
+            except Exception as e:
+                with self._lock:
+                    self.state = "open"
+                    self.failures += 1
+                    self.opened_at = time.monotonic()
+                    self.last_error = _short_error(e)
+                continue
+            self.record_success()
+            return
+
+@st.cache_resource
+def get_db_breaker() -> CircuitBreaker:
+    return CircuitBreaker(DB_BREAKER_COOLDOWN)
+
+@st.cache_resource
+def _pg_engine(url: str):
+    return create_engine(
+        url, echo=False, pool_pre_ping=True, pool_timeout=DB_CONNECT_TIMEOUT,
+        connect_args={"connect_timeout": DB_CONNECT_TIMEOUT},
+    )
+
+@st.cache_resource
+def _sqlite_engine():
+    os.makedirs("data", exist_ok=True)
+    return create_engine("sqlite:///data/app.db", echo=False)
+
+def _ping(eng):
+    with eng.connect() as conn:
+        conn.execute(text("select 1"))
+
+# 엔진/스키마/API는 로그인 게이트보다 먼저 준비됨(API가 UI 로그인과 무관하게 떠야 함)
+# → 연결 메시지는 모아 두었다가 게이트 통과 후에만 화면에 표시
+_db_messages = []
+
+def _db_msg(kind: str, *args):
+    _db_messages.append((kind, args))
+
 def build_engine_from_secrets_or_sqlite():
-    """Supabase 연결(정상), 실패/미설정 시 SQLite로 폴백."""
+    """Supabase 연결(정상), 실패/미설정/차단 중이면 SQLite로 폴백."""
     try:
-        st.write("🔧 build_engine_from_secrets_or_sqlite() 시작됨")
-        st.write("DEBUG/keys:", list(st.secrets.keys()))
+        _db_msg("write", "🔧 build_engine_from_secrets_or_sqlite() 시작됨")
+        _db_msg("write", "DEBUG/keys:", list(st.secrets.keys()))
 
         host = st.secrets["DB_HOST"].strip()
         port = st.secrets.get("DB_PORT", "6543").strip()
@@ -69,38 +170,58 @@ def build_engine_from_secrets_or_sqlite():
         pwd = quote_plus(st.secrets["DB_PASS"])  # ← 여기 인코딩 필수
         name = st.secrets.get("DB_NAME", "postgres").strip()
         project = st.secrets.get("DB_PROJECT", "").strip()
+        sslmode = st.secrets.get("DB_SSLMODE", "require").strip()  # 로컬 Postgres는 disable
 
         url = (
             f"postgresql+psycopg2://{user}:{pwd}@"
-            f"{host}:{port}/{name}?sslmode=require"
+            f"{host}:{port}/{name}?sslmode={sslmode}"
             + (f"&options=project%3D{project}" if project else "")
         )
-        st.write("DEBUG/url:", url)  # 👈 여기에 한 줄 추가!
-
-        eng = create_engine(url, echo=False, pool_pre_ping=True)
-
-        # 연결 테스트
-        with eng.connect() as conn:
-            conn.execute(text("select 1"))
-            st.caption("🟢 DB 연결: Supabase(Session pooler)")
+        _db_msg("write", "DEBUG/url:", url)  # 👈 여기에 한 줄 추가!
+    except Exception as e:
+        # 설정 누락 → 차단기와 무관하게 SQLite
+        _db_msg("error", f"DB 연결 실패: {e}")
+        _db_msg("warning", "🟡 DB 연결 실패: 로컬 SQLite로 대체합니다.")
+        return _sqlite_engine()
+
+    breaker = get_db_breaker()
+    if not breaker.allow():
+        # 최근 실패 기억 중 → 연결 시도 없이 즉시 폴백 (복구는 백그라운드에서 확인)
+        _db_msg("warning", "🟡 Postgres 차단 중: 로컬 SQLite로 대체합니다.")
+        return _sqlite_engine()
+
+    eng = _pg_engine(url)
+    try:
+        # 연결 테스트 (connect_timeout 초 안에 실패)
+        _ping(eng)
+        _db_msg("caption", "🟢 DB 연결: Supabase(Session pooler)")
         return eng
-
     except Exception as e:
-        st.error(f"DB 연결 실패: {e}")
+        breaker.record_failure(e, probe=lambda: _ping(eng))
+        _db_msg("error", f"DB 연결 실패: {e}")
+        _db_msg("warning", "🟡 DB 연결 실패: 로컬 SQLite로 대체합니다.")
+        return _sqlite_engine()
 
-        # 폴백: SQLite 로컬 파일
-        os.makedirs("data", exist_ok=True)
-        eng = create_engine("sqlite:///data/app.db", echo=False)
-        st.warning("🟡 DB 연결 실패: 로컬 SQLite로 대체합니다.")
-        return eng
+def render_db_breaker_status():
+    if "DB_HOST" not in st.secrets:
+        return
+    b = get_db_breaker()
+    if b.state == "closed":
+        st.caption("🟢 Postgres 연결 정상")
+    elif b.state == "half_open":
+        st.caption("🟡 Postgres 복구 확인 중…")
+    else:
+        st.caption(f"🔴 Postgres 차단 · {b.remaining():.0f}초 후 재확인 · 연속 실패 {b.failures}회")
+    if b.last_error:
+        st.caption(f"마지막 오류: {b.last_error}")
 
 
 engine = build_engine_from_secrets_or_sqlite()
 
 Base = declarative_base()
 SessionLocal = sessionmaker(bind=engine)
-st.caption(f"🔎 engine.url = {engine.url}")
-st.caption(f"🔎 dialect = {engine.dialect.name}")   # postgresql 이면 OK, sqlite면 폴백
+_db_msg("caption", f"🔎 engine.url = {engine.url}")
+_db_msg("caption", f"🔎 dialect = {engine.dialect.name}")   # postgresql 이면 OK, sqlite면 폴백
 # =========================================================
 # 모델
 # =========================================================
@@ -118,13 +239,12 @@ class Book(Base):
     binding = Column(String)                  # 제본 방식
     postprocess = Column(String)              # 후가공
 
-class Order(Base):
-    __tablename__ = "orders"
-
+class OrderColumns:
+    """orders / orders_archive 공통 컬럼"""
     id = Column(Integer, primary_key=True, autoincrement=True)
     book_id = Column(Integer, nullable=False)
     qty = Column(Integer, nullable=False)
-    date = Column(String, nullable=False)  # YYYY-MM-DD
+    date = Column(Date, nullable=False, index=True)  # 발주일
     vendor = Column(String)                # 제작처
 
     # 합계
@@ -171,7 +291,17 @@ class Order(Base):
     total_override = Column(Integer)             # 총액 수동입력(우선표시)
     memo = Column(Text)                          # 메모
 
-Base.metadata.create_all(bind=engine)
+class Order(OrderColumns, Base):
+    __tablename__ = "orders"
+    # SQLite: 보관으로 비거나 줄어든 orders에서 id가 재사용되지 않도록 (보관 테이블과 id 공유)
+    __table_args__ = {"sqlite_autoincrement": True}
+
+class OrderArchive(OrderColumns, Base):
+    """마감 연도 발주 보관 (Postgres는 연도별 파티션)"""
+    __tablename__ = "orders_archive"
+
+# orders_archive는 ensure_orders_archive()에서 생성(Postgres 파티션 DDL)
+Base.metadata.create_all(bind=engine, tables=[Book.__table__, Order.__table__])
 
 # =========================================================
 # Postgres/SQLite 겸용 컬럼 보장(마이그레이션)
@@ -230,6 +360,278 @@ def ensure_orders_columns():
 
 ensure_orders_columns()
 
+# =========================================================
+# 발주일 DATE 타입 / 인덱스 보장 + 마감 연도 보관 테이블
+#   - Postgres: 문자열 컬럼이면 DATE로 변환, 보관 테이블은 RANGE(date) 파티션
+#   - SQLite: 'YYYY-MM-DD' 문자열이 그대로 DATE로 읽히므로 인덱스만 추가
+# =========================================================
+def ensure_orders_date_column(eng):
+    dialect = eng.dialect.name.lower()
+    with eng.begin() as conn:
+        if dialect == "postgresql":
+            data_type = conn.execute(text("""
+                SELECT data_type FROM information_schema.columns
+                WHERE table_name = 'orders' AND column_name = 'date'
+            """)).scalar()
+            if data_type and data_type != "date":
+                conn.execute(text(
+                    "ALTER TABLE orders ALTER COLUMN date TYPE DATE USING date::date"
+                ))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_date ON orders (date)"))
+
+def ensure_orders_archive(eng):
+    if eng.dialect.name.lower() == "postgresql":
+        with eng.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS orders_archive (LIKE orders) PARTITION BY RANGE (date)"
+            ))
+    else:
+        OrderArchive.__table__.create(bind=eng, checkfirst=True)
+
+def ensure_orders_autoincrement(eng):
+    """SQLite 기존 orders를 AUTOINCREMENT 테이블로 재생성하고, 다음 id를 보관분 최대 id 뒤로 맞춘다.
+
+    Postgres는 시퀀스가 값을 재사용하지 않으므로 대상 아님.
+    """
+    if eng.dialect.name.lower() == "postgresql":
+        return
+    with eng.begin() as conn:
+        # pysqlite는 DDL 앞에서 트랜잭션을 열지 않음 → 재생성 전체를 한 트랜잭션으로
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        ddl = conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'orders'"
+        )).scalar() or ""
+        if "autoincrement" not in ddl.lower():
+            old_cols = {r[1] for r in conn.execute(text("PRAGMA table_info(orders)")).fetchall()}
+            cols = ", ".join(c.name for c in Order.__table__.columns if c.name in old_cols)
+            conn.execute(text("ALTER TABLE orders RENAME TO orders_old"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_orders_date"))
+            Order.__table__.create(bind=conn)
+            conn.execute(text(f"INSERT INTO orders ({cols}) SELECT {cols} FROM orders_old"))
+            conn.execute(text("DROP TABLE orders_old"))
+        top = conn.execute(text("""
+            SELECT max(id) FROM (SELECT id FROM orders UNION ALL SELECT id FROM orders_archive)
+        """)).scalar() or 0
+        if not conn.execute(text(
+            "UPDATE sqlite_sequence SET seq = max(seq, :top) WHERE name = 'orders'"
+        ), {"top": top}).rowcount:
+            conn.execute(text(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES ('orders', :top)"
+            ), {"top": top})
+
+# =========================================================
+# 통합 검색 인덱스
+#   - SQLite: FTS5 trigram 가상테이블 (한글 부분일치, bm25 순위)
+#   - Postgres: 일반 테이블 + pg_trgm GIN 인덱스
+#   - 행 키(rowid) = ref_id*2 (+1: 발주) → 도서/발주가 한 테이블을 공유
+#   - 쓰기 함수(add/update/delete)가 같은 트랜잭션에서 동기화
+#   - 비어 있을 때 처음 채우기는 search_index.rebuild_search_index() (일괄 INSERT ... SELECT)
+# =========================================================
+SEARCH_PAGE_SIZE = 20
+
+# Postgres 검색 대상 식 (GIN 인덱스 식과 동일해야 인덱스를 탄다)
+_PG_SEARCH_DOC = (
+    "(coalesce(title,'') || ' ' || coalesce(vendor,'') || ' ' || "
+    "coalesce(memo,'') || ' ' || coalesce(spec,''))"
+)
+_SQLITE_SEARCH_DOC = "(title || ' ' || vendor || ' ' || memo || ' ' || spec)"
+
+def ensure_search_index(eng) -> tuple[bool, bool]:
+    """검색 인덱스 테이블 생성(+비어 있으면 채움). (FTS5 trigram 사용, pg_trgm 사용) 여부 반환."""
+    dialect = eng.dialect.name.lower()
+    if dialect == "postgresql":
+        with eng.begin() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS search_index (
+                    rowid BIGINT PRIMARY KEY,
+                    kind TEXT NOT NULL, ref_id INTEGER NOT NULL, book_id INTEGER,
+                    title TEXT, vendor TEXT, memo TEXT, spec TEXT
+                )
+            """))
+        # 확장/인덱스는 권한 문제로 실패할 수 있음 → ILIKE 풀스캔 + 최신순으로 동작
+        try:
+            with eng.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_search_index_trgm ON search_index "
+                    f"USING gin ({_PG_SEARCH_DOC} gin_trgm_ops)"
+                ))
+        except Exception:
+            pass
+        with eng.connect() as conn:
+            trgm = conn.execute(text(
+                "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+            )).first() is not None
+        fts = False
+    else:
+        try:
+            with eng.begin() as conn:
+                conn.execute(text("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                        kind UNINDEXED, ref_id UNINDEXED, book_id UNINDEXED,
+                        title, vendor, memo, spec, tokenize='trigram'
+                    )
+                """))
+        except Exception:
+            # 구버전 SQLite(trigram 미지원): 일반 테이블 + 부분일치 스캔
+            with eng.begin() as conn:
+                conn.execute(text("""
+                    CREATE TABLE IF NOT EXISTS search_index (
+                        kind TEXT, ref_id INTEGER, book_id INTEGER,
+                        title TEXT, vendor TEXT, memo TEXT, spec TEXT
+                    )
+                """))
+        with eng.connect() as conn:
+            ddl = conn.execute(text(
+                "SELECT sql FROM sqlite_master WHERE name = 'search_index'"
+            )).scalar() or ""
+        fts = "fts5" in ddl.lower()
+        trgm = False
+
+    with eng.begin() as conn:
+        empty = conn.execute(text("SELECT count(*) FROM search_index")).scalar() == 0
+        if empty:
+            rebuild_search_index(conn)
+    return fts, trgm
+
+def _search_doc_id(kind: str, ref_id: int) -> int:
+    return int(ref_id) * 2 + (1 if kind == "order" else 0)
+
+def _index_put(conn, kind: str, ref_id: int, book_id, title="", vendor="", memo="", spec=""):
+    doc_id = _search_doc_id(kind, ref_id)
+    conn.execute(text("DELETE FROM search_index WHERE rowid = :d"), {"d": doc_id})
+    conn.execute(text("""
+        INSERT INTO search_index (rowid, kind, ref_id, book_id, title, vendor, memo, spec)
+        VALUES (:d, :kind, :ref_id, :book_id, :title, :vendor, :memo, :spec)
+    """), {
+        "d": doc_id, "kind": kind, "ref_id": int(ref_id), "book_id": book_id,
+        "title": title or "", "vendor": vendor or "", "memo": memo or "", "spec": spec or "",
+    })
+
+def _index_remove(conn, kind: str, ref_id: int):
+    conn.execute(text("DELETE FROM search_index WHERE rowid = :d"),
+                 {"d": _search_doc_id(kind, ref_id)})
+
+def _index_order_row(conn, order_id: int, book_id: int, vendor, memo, title=None):
+    if title is None:
+        title = conn.execute(text("SELECT title FROM books WHERE id = :b"),
+                             {"b": book_id}).scalar()
+    _index_put(conn, "order", order_id, book_id, title=title, vendor=vendor, memo=memo)
+
+def _index_book(conn, book_id: int):
+    """도서 행 + 그 도서의 발주 행(도서명 포함) 재색인. 도서가 없으면 도서 행 제거."""
+    b = conn.execute(text(
+        "SELECT title, inner_spec, binding FROM books WHERE id = :b"
+    ), {"b": book_id}).first()
+    if b:
+        _index_put(conn, "book", book_id, book_id, title=b[0],
+                   spec=" ".join(x for x in (b[1], b[2]) if x))
+    else:
+        _index_remove(conn, "book", book_id)
+    title = b[0] if b else ""
+    rows = conn.execute(text("""
+        SELECT id, vendor, memo FROM orders WHERE book_id = :b
+        UNION ALL
+        SELECT id, vendor, memo FROM orders_archive WHERE book_id = :b
+    """), {"b": book_id}).fetchall()
+    for oid, vendor, memo in rows:
+        _index_order_row(conn, oid, book_id, vendor, memo, title=title)
+
+def search_all(query: str, page: int = 1, page_size: int = SEARCH_PAGE_SIZE):
+    """메모/제작처/도서명/내지/제본 통합 검색 → (hits: list[dict], total: int)
+
+    - 공백으로 나눈 검색어는 모두 포함(AND)
+    - 3글자 이상은 FTS5 MATCH(bm25 순위), 2글자 이하는 부분일치 필터
+    """
+    terms = [t for t in (query or "").split() if t]
+    if not terms:
+        return [], 0
+
+    where, params = [], {}
+    if engine.dialect.name.lower() == "postgresql":
+        for i, t in enumerate(terms):
+            esc = t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where.append(f"{_PG_SEARCH_DOC} ILIKE :t{i}")
+            params[f"t{i}"] = f"%{esc}%"
+        if SEARCH_TRGM:
+            params["q"] = " ".join(terms)
+            rank = f"-word_similarity(:q, {_PG_SEARCH_DOC})"
+        else:
+            rank = None   # pg_trgm 없음 → 최신순
+    else:
+        long_terms = [t for t in terms if len(t) >= 3] if SEARCH_FTS else []
+        if long_terms:
+            where.append("search_index MATCH :m")
+            params["m"] = " AND ".join('"' + t.replace('"', '""') + '"' for t in long_terms)
+            # 가중치: kind, ref_id, book_id, title, vendor, memo, spec
+            rank = "bm25(search_index, 0, 0, 0, 3.0, 2.0, 2.0, 1.0)"
+        else:
+            rank = None
+        for i, t in enumerate(t for t in terms if t not in long_terms):
+            # trigram 테이블의 LIKE는 3글자 미만 패턴을 찾지 못함 → instr 사용
+            where.append(f"instr(lower({_SQLITE_SEARCH_DOC}), lower(:t{i})) > 0")
+            params[f"t{i}"] = t
+
+    cond = " AND ".join(where)
+    page = max(1, int(page))
+    with engine.connect() as conn:
+        total = conn.execute(text(f"SELECT count(*) FROM search_index WHERE {cond}"), params).scalar()
+        rows = conn.execute(text(f"""
+            SELECT kind, ref_id, book_id, title, vendor, memo, spec
+            FROM search_index WHERE {cond}
+            ORDER BY {rank + ", " if rank else ""}rowid DESC
+            LIMIT :limit OFFSET :offset
+        """), {**params, "limit": int(page_size), "offset": (page - 1) * int(page_size)}).fetchall()
+    hits = [dict(zip(("kind", "ref_id", "book_id", "title", "vendor", "memo", "spec"), r)) for r in rows]
+    return hits, int(total or 0)
+
+# =========================================================
+# 데이터 버전 (API ETag용)
+#   - 쓰기 함수가 같은 트랜잭션에서 임의 토큰으로 교체
+#   - 증가 카운터가 아니라 토큰이라 백업 복원 후에도 다른 상태와 겹치지 않음
+# =========================================================
+def ensure_data_version(eng):
+    with eng.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS app_meta (key VARCHAR(64) PRIMARY KEY, value TEXT)"
+        ))
+        exists = conn.execute(text(
+            "SELECT 1 FROM app_meta WHERE key = 'data_version'"
+        )).first()
+        if not exists:
+            conn.execute(text(
+                "INSERT INTO app_meta (key, value) VALUES ('data_version', :v)"
+            ), {"v": uuid.uuid4().hex})
+
+def _bump_data_version(conn):
+    conn.execute(text(
+        "UPDATE app_meta SET value = :v WHERE key = 'data_version'"
+    ), {"v": uuid.uuid4().hex})
+
+def get_data_version() -> str:
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT value FROM app_meta WHERE key = 'data_version'"
+        )).scalar() or ""
+
+# =========================================================
+# 스키마 준비 (엔진별 1회)
+#   - information_schema 조회, CREATE INDEX(Postgres는 SHARE 락), 검색 인덱스 count 등을
+#     rerun마다 하지 않도록 st.cache_resource로 엔진(DB)마다 한 번만 실행
+#   - _engine은 해시에서 제외 → engine_url이 캐시 키. 백업 복원 후에는 clear()
+# =========================================================
+@st.cache_resource
+def ensure_schema(_engine, engine_url: str) -> tuple[bool, bool]:
+    """발주 DATE/보관 테이블/id 시퀀스, 검색 인덱스, 데이터 버전 보장 → (FTS5, pg_trgm) 사용 여부"""
+    ensure_orders_date_column(_engine)
+    ensure_orders_archive(_engine)
+    ensure_orders_autoincrement(_engine)
+    search_mode = ensure_search_index(_engine)
+    ensure_data_version(_engine)
+    return search_mode
+
+SEARCH_FTS, SEARCH_TRGM = ensure_schema(engine, str(engine.url))
+
 # =========================================================
 # 공용 함수
 # =========================================================
@@ -242,6 +644,12 @@ def _to_int(x):
     except:
         return 0
 
+def _to_date(x) -> date:
+    """date 또는 'YYYY-MM-DD' 문자열 → date"""
+    if isinstance(x, date):
+        return x
+    return date.fromisoformat(str(x).strip()[:10])
+
 def calc_supply_and_vat(data_dict: dict):
     """*_cost 항목들을 합쳐 공급가/부가세/총액 계산"""
     keys_to_sum = [
@@ -260,18 +668,50 @@ def calc_supply_and_vat(data_dict: dict):
 # =========================================================
 # Book CRUD
 # =========================================================
+BOOK_PAGE_SIZE = 25
+
 def add_book(book: dict):
     s = get_session()
     try:
-        s.add(Book(**book))
+        b = Book(**book)
+        s.add(b)
+        s.flush()
+        _index_book(s.connection(), b.id)
+        _bump_data_version(s.connection())
         s.commit()
     finally:
         s.close()
 
-def get_books():
+def _filter_books(q, title: str | None):
+    title = (title or "").strip()
+    if title:
+        q = q.filter(Book.title.contains(title, autoescape=True))
+    return q
+
+def get_books(limit: int | None = None, offset: int = 0, title: str | None = None):
+    s = get_session()
+    try:
+        q = _filter_books(s.query(Book), title).order_by(Book.id.desc())
+        if limit is not None:
+            q = q.offset(offset).limit(limit)
+        return q.all()
+    finally:
+        s.close()
+
+def count_books(title: str | None = None) -> int:
+    s = get_session()
+    try:
+        return _filter_books(s.query(func.count(Book.id)), title).scalar() or 0
+    finally:
+        s.close()
+
+def get_book_summaries(title: str | None = None, limit: int = BOOK_PAGE_SIZE, offset: int = 0):
+    """도서 목록 표용: 요약 컬럼만 조회 → [(id, title, format, total_pages, binding)]"""
     s = get_session()
     try:
-        return s.query(Book).order_by(Book.id.desc()).all()
+        q = s.query(Book.id, Book.title, Book.format, Book.total_pages, Book.binding)
+        q = _filter_books(q, title).order_by(Book.id.desc())
+        return q.offset(offset).limit(limit).all()
     finally:
         s.close()
 
@@ -282,6 +722,9 @@ def update_book(book_id: int, fields: dict):
         if b:
             for k, v in fields.items():
                 setattr(b, k, v)
+            s.flush()
+            _index_book(s.connection(), book_id)
+            _bump_data_version(s.connection())
             s.commit()
     finally:
         s.close()
@@ -292,6 +735,9 @@ def delete_book(book_id: int):
         b = s.query(Book).filter(Book.id == book_id).first()
         if b:
             s.delete(b)
+            s.flush()
+            _index_book(s.connection(), book_id)
+            _bump_data_version(s.connection())
             s.commit()
     finally:
         s.close()
@@ -316,7 +762,7 @@ def add_order(order_data: dict):
         o = Order(
             book_id=order_data["book_id"],
             qty=qty,
-            date=order_data["date"],
+            date=_to_date(order_data["date"]),
             vendor=order_data.get("vendor", ""),
             supply_price=supply, vat_price=vat, total_price=total,
             unit_price=unit_price,
@@ -361,26 +807,105 @@ def add_order(order_data: dict):
             delivery_cost=_to_int(order_data.get("delivery_cost", 0)),
         )
         s.add(o)
+        s.flush()
+        _index_order_row(s.connection(), o.id, o.book_id, o.vendor, o.memo)
+        _bump_data_version(s.connection())
         s.commit()
     finally:
         s.close()
 
-def get_orders(book_id: int, qty_filter: int | None = None):
+def get_orders(book_id: int, qty_filter: int | None = None,
+               date_from: date | None = None, date_to: date | None = None,
+               archived: bool = False):
+    """도서별 발주 조회. date_from/date_to는 양끝 포함. archived=True면 보관 테이블 조회."""
+    model = OrderArchive if archived else Order
+    s = get_session()
+    try:
+        q = _filter_orders(s.query(model), model, book_id, qty_filter, date_from, date_to)
+        return q.order_by(model.id.desc()).all()
+    finally:
+        s.close()
+
+def get_order(order_id: int):
+    s = get_session()
+    try:
+        return s.query(Order).filter(Order.id == order_id).first()
+    finally:
+        s.close()
+
+def get_book(book_id: int):
+    s = get_session()
+    try:
+        return s.query(Book).filter(Book.id == book_id).first()
+    finally:
+        s.close()
+
+def get_vendors() -> list[str]:
+    s = get_session()
+    try:
+        rows = s.query(Order.vendor).filter(Order.vendor.isnot(None), Order.vendor != "") \
+            .distinct().order_by(Order.vendor).all()
+        return [r[0] for r in rows]
+    finally:
+        s.close()
+
+def get_orders_with_books(vendor: str | None = None,
+                          date_from: date | None = None, date_to: date | None = None,
+                          invoice_issued: bool | None = None,
+                          limit: int | None = None, offset: int = 0):
+    """제작처/발주일 범위/계산서 여부로 발주 조회 → [(Order, Book|None)] (발주서 일괄 생성, API용)"""
+    s = get_session()
+    try:
+        q = s.query(Order, Book).outerjoin(Book, Book.id == Order.book_id)
+        q = _filter_orders_global(q, vendor, date_from, date_to, invoice_issued)
+        q = q.order_by(Order.date, Order.id)
+        if limit is not None:
+            q = q.offset(offset).limit(limit)
+        return q.all()
+    finally:
+        s.close()
+
+def count_orders(vendor: str | None = None,
+                 date_from: date | None = None, date_to: date | None = None,
+                 invoice_issued: bool | None = None) -> int:
     s = get_session()
     try:
-        q = s.query(Order).filter(Order.book_id == book_id)
-        if qty_filter:
-            q = q.filter(Order.qty == qty_filter)
-        return q.order_by(Order.id.desc()).all()
+        q = _filter_orders_global(s.query(func.count(Order.id)), vendor, date_from, date_to, invoice_issued)
+        return q.scalar() or 0
     finally:
         s.close()
 
+def _filter_orders_global(q, vendor, date_from, date_to, invoice_issued):
+    if vendor:
+        q = q.filter(Order.vendor == vendor)
+    if date_from:
+        q = q.filter(Order.date >= date_from)
+    if date_to:
+        q = q.filter(Order.date <= date_to)
+    if invoice_issued is True:
+        q = q.filter(Order.invoice_issued == 1)
+    elif invoice_issued is False:
+        q = q.filter((Order.invoice_issued == 0) | Order.invoice_issued.is_(None))
+    return q
+
+def _filter_orders(q, model, book_id, qty_filter, date_from, date_to):
+    q = q.filter(model.book_id == book_id)
+    if qty_filter:
+        q = q.filter(model.qty == qty_filter)
+    if date_from:
+        q = q.filter(model.date >= date_from)
+    if date_to:
+        q = q.filter(model.date <= date_to)
+    return q
+
 def delete_order(order_id: int):
     s = get_session()
     try:
         o = s.query(Order).filter(Order.id == order_id).first()
         if o:
             s.delete(o)
+            _index_remove(s.connection(), "order", order_id)
+            _bump_data_version(s.connection())
             s.commit()
     finally:
         s.close()
@@ -391,6 +916,7 @@ def set_invoice_status(order_id: int, is_issued: bool):
         o = s.query(Order).filter(Order.id == order_id).first()
         if o:
             o.invoice_issued = 1 if is_issued else 0
+            _bump_data_version(s.connection())
             s.commit()
     finally:
         s.close()
@@ -402,10 +928,174 @@ def set_order_override_and_memo(order_id: int, total_override: int, memo: str):
         if o:
             o.total_override = _to_int(total_override)
             o.memo = (memo or "").strip()
+            _index_order_row(s.connection(), o.id, o.book_id, o.vendor, o.memo)
+            _bump_data_version(s.connection())
             s.commit()
     finally:
         s.close()
 
+# =========================================================
+# 마감 연도 보관(archive)
+#   - 연도 단위로 orders → orders_archive 이동 (한 트랜잭션)
+#   - 검색 인덱스 행은 그대로 유지 → 통합 검색으로 계속 조회 가능
+# =========================================================
+def get_order_years(archived: bool = False) -> list[int]:
+    model = OrderArchive if archived else Order
+    s = get_session()
+    try:
+        year = func.extract("year", model.date)
+        rows = s.query(year).distinct().order_by(year.desc()).all()
+        return [int(r[0]) for r in rows if r[0] is not None]
+    finally:
+        s.close()
+
+def archive_year(year: int) -> int:
+    """year년도 발주를 보관 테이블로 이동하고 이동 건수를 반환."""
+    year = int(year)
+    start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    cols = ", ".join(c.name for c in Order.__table__.columns)
+    with engine.begin() as conn:
+        if engine.dialect.name.lower() == "postgresql":
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS orders_archive_{year} PARTITION OF orders_archive "
+                f"FOR VALUES FROM ('{start}') TO ('{end}')"
+            ))
+        params = {"start": str(start), "end": str(end)}
+        conn.execute(text(f"""
+            INSERT INTO orders_archive ({cols})
+            SELECT {cols} FROM orders WHERE date >= :start AND date < :end
+        """), params)
+        moved = conn.execute(text(
+            "DELETE FROM orders WHERE date >= :start AND date < :end"
+        ), params).rowcount
+        _bump_data_version(conn)
+    return moved or 0
+
+# =========================================================
+# 읽기 전용 JSON API (ERP / 창고 시트 연동)
+#   - Secrets에 API_TOKEN이 있을 때만 같은 프로세스에서 API_HOST:API_PORT(기본 127.0.0.1:8502)로 실행
+#   - 요청 헤더: Authorization: Bearer <API_TOKEN>
+#   - ETag = 데이터 버전 + 경로/쿼리 → If-None-Match 일치 시 304 (DB는 버전 1건만 조회)
+#
+#   GET /api/books?page=1&page_size=50
+#   GET /api/orders?vendor=&date_from=YYYY-MM-DD&date_to=&invoice_issued=0|1&page=&page_size=
+#   GET /api/orders/uninvoiced?vendor=&date_from=&date_to=&page=&page_size=
+# =========================================================
+API_TOKEN = str(st.secrets.get("API_TOKEN", "")).strip()
+API_HOST = str(st.secrets.get("API_HOST", "127.0.0.1")).strip()
+API_PORT = int(st.secrets.get("API_PORT", 8502))
+API_DEFAULT_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+
+def _row_dict(obj) -> dict:
+    out = {}
+    for c in obj.__table__.columns:
+        v = getattr(obj, c.name)
+        out[c.name] = v.isoformat() if isinstance(v, date) else v
+    return out
+
+def _parse_bool(v):
+    if v in (None, ""):
+        return None
+    if v.lower() in ("1", "true", "yes"):
+        return True
+    if v.lower() in ("0", "false", "no"):
+        return False
+    raise ValueError(f"잘못된 불리언 값: {v}")
+
+class ReadOnlyAPI:
+    """HTTP 서버 스레드는 프로세스에 하나. rerun마다 bind()로 최신 조회 함수를 연결."""
+
+    def __init__(self, token: str):
+        self.token = token
+        self.funcs = {}
+        self.routes = {
+            "/api/books": self._books,
+            "/api/orders": self._orders,
+            "/api/orders/uninvoiced": lambda q, limit, offset: self._orders(q, limit, offset, uninvoiced=True),
+        }
+
+    def bind(self, **funcs):
+        self.funcs = funcs
+
+    def _books(self, q, limit, offset):
+        f = self.funcs
+        return {
+            "total": f["count_books"](),
+            "items": [_row_dict(b) for b in f["get_books"](limit=limit, offset=offset)],
+        }
+
+    def _orders(self, q, limit, offset, uninvoiced=False):
+        f = self.funcs
+        filters = dict(
+            vendor=q.get("vendor") or None,
+            date_from=_to_date(q["date_from"]) if q.get("date_from") else None,
+            date_to=_to_date(q["date_to"]) if q.get("date_to") else None,
+            invoice_issued=False if uninvoiced else _parse_bool(q.get("invoice_issued")),
+        )
+        rows = f["get_orders_with_books"](limit=limit, offset=offset, **filters)
+        return {
+            "total": f["count_orders"](**filters),
+            "items": [{**_row_dict(o), "book_title": b.title if b else None} for o, b in rows],
+        }
+
+    def respond(self, raw_path: str, headers) -> tuple[int, dict, dict | None]:
+        # 상수 시간 비교 (bytes: 비ASCII 헤더에도 예외 없이 불일치 처리)
+        if not hmac.compare_digest(headers.get("Authorization", "").encode("utf-8"),
+                                   f"Bearer {self.token}".encode("utf-8")):
+            return 401, {}, {"error": "unauthorized"}
+        url = urlparse(raw_path)
+        route = self.routes.get(url.path.rstrip("/"))
+        if route is None:
+            return 404, {}, {"error": "not found"}
+        if not self.funcs:
+            return 503, {"Retry-After": "5"}, {"error": "not ready"}
+
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        version = self.funcs["get_data_version"]()
+        key = f"{version}|{url.path}|{sorted(q.items())}"
+        etag = f'W/"{hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]}"'
+        inm = headers.get("If-None-Match", "")
+        if inm.strip() == "*" or etag in [t.strip() for t in inm.split(",")]:
+            return 304, {"ETag": etag}, None
+
+        try:
+            page = max(1, int(q.get("page", 1)))
+            page_size = min(API_MAX_PAGE_SIZE, max(1, int(q.get("page_size", API_DEFAULT_PAGE_SIZE))))
+            data = route(q, page_size, (page - 1) * page_size)
+        except ValueError as e:
+            return 400, {}, {"error": str(e)}
+        body = {**data, "page": page, "page_size": page_size, "data_version": version}
+        return 200, {"ETag": etag, "Cache-Control": "no-cache"}, body
+
+@st.cache_resource
+def start_api_server(host: str, port: int, token: str) -> ReadOnlyAPI:
+    api = ReadOnlyAPI(token)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            try:
+                status, headers, body = api.respond(self.path, self.headers)
+            except Exception as e:
+                status, headers, body = 500, {}, {"error": _short_error(e)}
+            payload = b"" if body is None else json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            if body is not None:
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return api
+
 # =========================================================
 # 페이지 1) 🔍 발주 조회
 #   - 총액 수동입력, 메모 열 편집 + 저장
@@ -428,22 +1118,72 @@ def render_order_query_page():
         st.info("검색된 도서가 없습니다.")
         return
 
-    selected_book = st.selectbox(
+    # 옵션은 도서 id (ORM 객체는 rerun마다 새로 생성되므로 id로 선택 상태 유지)
+    books_by_id = {b.id: b for b in filtered_books}
+    selected_id = st.selectbox(
         "도서 선택",
-        options=filtered_books,
-        format_func=lambda x: f"{x.title} ({x.format})",
+        options=list(books_by_id),
+        format_func=lambda bid: f"{books_by_id[bid].title} ({books_by_id[bid].format})",
         key="query_book_select"
     )
+    selected_book = books_by_id.get(selected_id)
     if not selected_book:
         return
 
-    # 부수 필터
-    qty_filter_text = st.text_input("부수 검색 (숫자만 입력)", key="query_qty_filter")
-    orders = get_orders(
-        selected_book.id,
-        int(qty_filter_text) if qty_filter_text.isdigit() else None
+    # 부수 / 발주일 범위 필터
+    f1, f2, f3 = st.columns([1, 1, 1])
+    with f1:
+        qty_filter_text = st.text_input("부수 검색 (숫자만 입력)", key="query_qty_filter")
+    with f2:
+        date_range = st.date_input("발주일 범위 (선택)", value=(), key="query_date_range")
+    with f3:
+        include_archived = st.checkbox("보관된 연도 포함", value=False, key="query_include_archived")
+    date_from = date_range[0] if len(date_range) > 0 else None
+    date_to = date_range[1] if len(date_range) > 1 else None
+
+    filters = dict(
+        qty_filter=int(qty_filter_text) if qty_filter_text.isdigit() else None,
+        date_from=date_from, date_to=date_to,
     )
 
+    if include_archived:
+        archived = get_orders(selected_book.id, archived=True, **filters)
+        if archived:
+            st.markdown("### 🗄️ 보관된 발주 (읽기 전용)")
+            st.dataframe(pd.DataFrame([{
+                "발주일": o.date,
+                "제작처": o.vendor or "",
+                "부수": o.qty,
+                "총액(VAT 포함)": (o.total_override if (o.total_override not in (None, 0)) else (o.total_price or 0)),
+                "메모": o.memo or "",
+                "계산서 발행": bool(o.invoice_issued),
+            } for o in archived]), hide_index=True)
+
+    # 전체 실행에서는 발주를 한 번만 조회해 fragment에 넘김
+    orders = get_orders(selected_book.id, **filters)
+    if not orders:
+        st.info("발주 내역이 없습니다.")
+        return
+
+    _order_editor_fragment(selected_book.id, filters, {"orders": orders})
+
+    st.markdown("### 세부 항목")
+    prefetched = {o.id: o for o in orders}
+    for o in orders:
+        _order_detail_fragment(o.id, prefetched)
+
+# ---------------------------------------------------------
+# 발주 조회 fragment
+#   - 편집/체크/확인 버튼은 해당 fragment만 다시 실행
+#   - 저장/삭제처럼 다른 화면에도 반영돼야 하는 쓰기는 전체 rerun
+#   - prefetched: 전체 실행에서 미리 읽은 행. 한 번 쓰고 꺼내 버리므로
+#     fragment 단독 rerun(같은 인자 재사용)에서는 비어 있어 다시 조회함
+# ---------------------------------------------------------
+@st.fragment
+def _order_editor_fragment(book_id: int, filters: dict, prefetched: dict):
+    orders = prefetched.pop("orders", None)
+    if orders is None:
+        orders = get_orders(book_id, **filters)
     if not orders:
         st.info("발주 내역이 없습니다.")
         return
@@ -519,77 +1259,94 @@ def render_order_query_page():
             st.success(f"{changed_count}건이 저장되었습니다.")
             st.rerun()
 
-    st.markdown("### 세부 항목")
+def _set_confirm_delete_order(order_id):
+    st.session_state["confirm_delete_order"] = order_id
 
-    for o in orders:
-        # 표기용 총액: 수동입력이 있으면 우선
-        shown_total = o.total_override if (o.total_override not in (None, 0)) else (o.total_price or 0)
-        header = f"📄 {o.date} · {o.qty}부 · 총액 {shown_total:,}원"
-        with st.expander(header, expanded=False):
-            st.markdown(
-                f"**공급가:** {(o.supply_price or 0):,}원 · "
-                f"**부가세:** {(o.vat_price or 0):,}원 · "
-                f"**총액(표시):** {shown_total:,}원"
-            )
-            st.write(f"• 제작처: {o.vendor or '—'}")
-            st.write(f"• 권당 가격: {(o.unit_price or 0):,}원")
-            st.write(f"• 계산서 발행: {'✅ 발행됨' if getattr(o, 'invoice_issued', 0) else '❌ 미발행'}")
-            if o.memo:
-                st.write(f"• 메모: {o.memo}")
-
-            # 보조 출력 함수
-            def show_line(label, unit, cost):
-                u = unit or 0
-                c = cost or 0
-                if u or c:
-                    st.write(f"- {label} 단가: {u:,} | 비용: {c:,}원")
-
-            st.subheader("표지")
-            show_line("CTP", o.cover_ctp_unit, o.cover_ctp_cost)
-            show_line("인쇄", o.cover_print_unit, o.cover_print_cost)
-            show_line("종이", o.cover_paper_unit, o.cover_paper_cost)
-
-            st.subheader("본문1")
-            show_line("CTP", o.inner1_ctp_unit, o.inner1_ctp_cost)
-            show_line("인쇄", o.inner1_print_unit, o.inner1_print_cost)
-            show_line("종이", o.inner1_paper_unit, o.inner1_paper_cost)
-
-            if (o.inner2_ctp_cost or 0) or (o.inner2_print_cost or 0) or (o.inner2_paper_cost or 0):
-                st.subheader("본문2")
-                show_line("CTP", o.inner2_ctp_unit, o.inner2_ctp_cost)
-                show_line("인쇄", o.inner2_print_unit, o.inner2_print_cost)
-                show_line("종이", o.inner2_paper_unit, o.inner2_paper_cost)
-
-            st.subheader("면지 / 제본")
-            show_line("면지", o.endpaper_unit, o.endpaper_cost)
-            show_line("제본", o.binding_unit, o.binding_cost)
-
-            st.subheader("후가공")
-            show_line("라미네이팅", o.laminating_unit, o.laminating_cost)
-            show_line("에폭시", o.epoxy_unit, o.epoxy_cost)
-            show_line("제판대", o.plate_unit, o.plate_cost)
-            show_line("필름", o.film_unit, o.film_cost)
-
-            # 발주 취소
-            cols = st.columns(2)
-            with cols[0]:
-                if st.button("✖️ 발주 취소", key=f"cancel_order_btn_{o.id}"):
-                    st.session_state["confirm_delete_order"] = o.id
-                    st.rerun()
+@st.fragment
+def _order_detail_fragment(order_id: int, prefetched: dict):
+    o = prefetched.pop(order_id, None) or get_order(order_id)
+    if not o:
+        return
 
-            if st.session_state.get("confirm_delete_order") == o.id:
-                st.warning("정말 이 발주를 취소(삭제)하시겠습니까? 이 작업은 되돌릴 수 없습니다.")
-                c1, c2 = st.columns(2)
-                with c1:
-                    if st.button("✅ 예, 삭제합니다", key=f"confirm_delete_yes_{o.id}"):
-                        delete_order(o.id)
-                        st.success("발주가 취소되었습니다.")
-                        st.session_state["confirm_delete_order"] = None
-                        st.rerun()
-                with c2:
-                    if st.button("취소", key=f"confirm_delete_no_{o.id}"):
-                        st.session_state["confirm_delete_order"] = None
-                        st.rerun()
+    # 표기용 총액: 수동입력이 있으면 우선
+    shown_total = o.total_override if (o.total_override not in (None, 0)) else (o.total_price or 0)
+    header = f"📄 {o.date} · {o.qty}부 · 총액 {shown_total:,}원"
+    with st.expander(header, expanded=False):
+        st.markdown(
+            f"**공급가:** {(o.supply_price or 0):,}원 · "
+            f"**부가세:** {(o.vat_price or 0):,}원 · "
+            f"**총액(표시):** {shown_total:,}원"
+        )
+        st.write(f"• 제작처: {o.vendor or '—'}")
+        st.write(f"• 권당 가격: {(o.unit_price or 0):,}원")
+        st.write(f"• 계산서 발행: {'✅ 발행됨' if getattr(o, 'invoice_issued', 0) else '❌ 미발행'}")
+        if o.memo:
+            st.write(f"• 메모: {o.memo}")
+
+        # 보조 출력 함수
+        def show_line(label, unit, cost):
+            u = unit or 0
+            c = cost or 0
+            if u or c:
+                st.write(f"- {label} 단가: {u:,} | 비용: {c:,}원")
+
+        st.subheader("표지")
+        show_line("CTP", o.cover_ctp_unit, o.cover_ctp_cost)
+        show_line("인쇄", o.cover_print_unit, o.cover_print_cost)
+        show_line("종이", o.cover_paper_unit, o.cover_paper_cost)
+
+        st.subheader("본문1")
+        show_line("CTP", o.inner1_ctp_unit, o.inner1_ctp_cost)
+        show_line("인쇄", o.inner1_print_unit, o.inner1_print_cost)
+        show_line("종이", o.inner1_paper_unit, o.inner1_paper_cost)
+
+        if (o.inner2_ctp_cost or 0) or (o.inner2_print_cost or 0) or (o.inner2_paper_cost or 0):
+            st.subheader("본문2")
+            show_line("CTP", o.inner2_ctp_unit, o.inner2_ctp_cost)
+            show_line("인쇄", o.inner2_print_unit, o.inner2_print_cost)
+            show_line("종이", o.inner2_paper_unit, o.inner2_paper_cost)
+
+        st.subheader("면지 / 제본")
+        show_line("면지", o.endpaper_unit, o.endpaper_cost)
+        show_line("제본", o.binding_unit, o.binding_cost)
+
+        st.subheader("후가공")
+        show_line("라미네이팅", o.laminating_unit, o.laminating_cost)
+        show_line("에폭시", o.epoxy_unit, o.epoxy_cost)
+        show_line("제판대", o.plate_unit, o.plate_cost)
+        show_line("필름", o.film_unit, o.film_cost)
+
+        # 발주서 (내용이 같으면 캐시된 문서 재사용)
+        if st.button("📄 발주서", key=f"po_btn_{o.id}"):
+            payload = purchase_order.make_payload(o, get_book(o.book_id))
+            path = purchase_order.render_cached(payload)
+            with open(path, "rb") as f:
+                st.download_button(
+                    "⬇️ 발주서 내려받기(HTML)", f.read(),
+                    file_name=purchase_order.document_name(payload),
+                    mime="text/html", key=f"po_dl_{o.id}",
+                )
+            purchase_order.prune_cache()
+
+        # 발주 취소
+        cols = st.columns(2)
+        with cols[0]:
+            # 확인창 열기/닫기는 콜백으로 처리 → 이 fragment만 다시 그려짐
+            st.button("✖️ 발주 취소", key=f"cancel_order_btn_{o.id}",
+                      on_click=_set_confirm_delete_order, args=(o.id,))
+
+        if st.session_state.get("confirm_delete_order") == o.id:
+            st.warning("정말 이 발주를 취소(삭제)하시겠습니까? 이 작업은 되돌릴 수 없습니다.")
+            c1, c2 = st.columns(2)
+            with c1:
+                if st.button("✅ 예, 삭제합니다", key=f"confirm_delete_yes_{o.id}"):
+                    delete_order(o.id)
+                    st.success("발주가 취소되었습니다.")
+                    st.session_state["confirm_delete_order"] = None
+                    st.rerun()
+            with c2:
+                st.button("취소", key=f"confirm_delete_no_{o.id}",
+                          on_click=_set_confirm_delete_order, args=(None,))
 
 # =========================================================
 # 페이지 2) 📦 발주 입력
@@ -605,13 +1362,19 @@ def render_order_input_page():
         st.info("도서가 아직 없습니다. 먼저 도서 사양을 등록해 주세요.")
         return
 
-    book_choice = st.selectbox(
-        "도서 선택", options=books,
-        format_func=lambda x: f"{x.title} ({x.format})",
+    books_by_id = {b.id: b for b in books}
+    book_choice = books_by_id[st.selectbox(
+        "도서 선택", options=list(books_by_id),
+        format_func=lambda bid: f"{books_by_id[bid].title} ({books_by_id[bid].format})",
         key="order_book_select"
-    )
+    )]
+
+    _order_entry_fragment(book_choice.id)
 
-    with st.form("order_form_detail"):
+@st.fragment
+def _order_entry_fragment(book_id: int):
+    """발주 입력 폼 — 값을 바꾸면 이 부분만 다시 실행되어 합계 미리보기가 바로 갱신됨"""
+    with st.container(border=True):
         c1, c2, c3 = st.columns([1,1,1])
         with c1:
             qty = st.number_input("제작 부수", min_value=1, step=100, value=1000)
@@ -705,9 +1468,9 @@ def render_order_input_page():
             f"**총액(VAT 포함):** {tot:,}원"
         )
 
-        if st.form_submit_button("📝 발주 저장"):
+        if st.button("📝 발주 저장", key="order_save_btn"):
             payload = {
-                "book_id": book_choice.id, "qty": qty, "date": str(order_date), "vendor": vendor,
+                "book_id": book_id, "qty": qty, "date": order_date, "vendor": vendor,
                 "unit_price": unit_price,
                 "cover_ctp_unit":cover_ctp_unit, "cover_ctp_cost":cover_ctp_cost,
                 "cover_print_unit":cover_print_unit, "cover_print_cost":cover_print_cost,
@@ -768,92 +1531,304 @@ def render_book_spec_page():
             st.rerun()
 
     st.subheader("📖 등록된 도서 목록")
-    books = get_books()
-    if not books:
-        st.info("아직 등록된 도서가 없습니다.")
+
+    # 목록은 요약 컬럼만 한 페이지씩 조회하고, 상세/수정은 선택한 도서 1건만 불러온다
+    title_filter = st.text_input(
+        "도서명 검색", key="book_catalog_filter",
+        on_change=lambda: st.session_state.update(book_catalog_page=1),
+    )
+    total = count_books(title_filter)
+    if not total:
+        st.info("검색된 도서가 없습니다." if (title_filter or "").strip() else "아직 등록된 도서가 없습니다.")
         return
 
-    if "edit_mode" not in st.session_state:
-        st.session_state["edit_mode"] = False
-        st.session_state["edit_id"] = None
+    pages = max(1, -(-total // BOOK_PAGE_SIZE))
+    page = min(int(st.session_state.get("book_catalog_page", 1)), pages)
+    st.session_state["book_catalog_page"] = page
+    rows = get_book_summaries(title_filter, limit=BOOK_PAGE_SIZE, offset=(page - 1) * BOOK_PAGE_SIZE)
+
+    st.caption(f"도서 {total:,}권 · {page}/{pages} 페이지")
+    st.dataframe(pd.DataFrame([{
+        "도서명": r.title,
+        "판형": r.format or "",
+        "총 페이지": r.total_pages or 0,
+        "제본": r.binding or "",
+    } for r in rows]), hide_index=True)
+    if pages > 1:
+        st.number_input("페이지", min_value=1, max_value=pages, step=1, key="book_catalog_page")
+
+    rows_by_id = {r.id: r for r in rows}
+    selected_id = st.selectbox(
+        "상세 보기 / 수정할 도서",
+        options=[None] + list(rows_by_id),
+        format_func=lambda bid: "(선택)" if bid is None else f"{rows_by_id[bid].title} ({rows_by_id[bid].format})",
+        key="book_catalog_select",
+    )
+    if selected_id is not None:
+        _book_detail_fragment(selected_id)
+
+# ---------------------------------------------------------
+# 도서 상세 fragment
+#   - 수정/취소는 이 fragment만 다시 실행
+#   - 저장/삭제는 목록에도 반영돼야 하므로 전체 rerun
+# ---------------------------------------------------------
+def _set_book_edit(book_id):
+    st.session_state["edit_mode"] = book_id is not None
+    st.session_state["edit_id"] = book_id
+
+@st.fragment
+def _book_detail_fragment(book_id: int):
+    b = get_book(book_id)
+    if not b:
+        return
 
-    for b in books:
-        with st.expander(f"📘 {b.title} ({b.format})"):
-            st.write(f"**표지:** {b.cover_paper}, {b.cover_color}")
-            st.write(f"**내지:** {b.inner_spec} (총 {b.total_pages}쪽)")
-            st.write(f"**면지:** {b.endpaper} · **날개:** {b.wing}")
-            st.write(f"**제본:** {b.binding}")
-            if b.postprocess:
-                st.write(f"**후가공:** {b.postprocess}")
+    with st.container(border=True):
+        st.markdown(f"**📘 {b.title} ({b.format})**")
+        st.write(f"**표지:** {b.cover_paper}, {b.cover_color}")
+        st.write(f"**내지:** {b.inner_spec} (총 {b.total_pages}쪽)")
+        st.write(f"**면지:** {b.endpaper} · **날개:** {b.wing}")
+        st.write(f"**제본:** {b.binding}")
+        if b.postprocess:
+            st.write(f"**후가공:** {b.postprocess}")
 
-            c1, c2 = st.columns(2)
-            with c1:
-                if st.button("✏️ 수정", key=f"edit_button_{b.id}"):
-                    st.session_state["edit_mode"] = True
-                    st.session_state["edit_id"] = b.id
-                    st.rerun()
-            with c2:
-                if st.button("❌ 삭제", key=f"delete_button_{b.id}"):
-                    delete_book(b.id)
-                    st.success("도서를 삭제했습니다.")
-                    st.rerun()
+        c1, c2 = st.columns(2)
+        with c1:
+            st.button("✏️ 수정", key=f"edit_button_{b.id}", on_click=_set_book_edit, args=(b.id,))
+        with c2:
+            if st.button("❌ 삭제", key=f"delete_button_{b.id}"):
+                delete_book(b.id)
+                _set_book_edit(None)
+                st.success("도서를 삭제했습니다.")
+                st.rerun()
+
+        if st.session_state.get("edit_mode") and st.session_state.get("edit_id") == b.id:
+            with st.form(f"edit_form_{b.id}"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    title_e = st.text_input("도서명(수정)", b.title)
+                    format_e = st.text_input("판형(수정)", b.format or "")
+                    cover_paper_e = st.text_input("표지 용지(수정)", b.cover_paper or "")
+                    cover_color_e = st.text_input("표지 도수/양단면(수정)", b.cover_color or "")
+                with col2:
+                    total_pages_e = st.number_input("총 페이지 수(수정)", min_value=0, step=1, value=int(b.total_pages or 0))
+                    endpaper_e = st.selectbox("면지 여부(수정)", ["없음","있음"], index=(0 if (b.endpaper or "없음")=="없음" else 1), key=f"endpaper_{b.id}")
+                    wing_e = st.selectbox("날개 여부(수정)", ["없음","있음"], index=(0 if (b.wing or "없음")=="없음" else 1), key=f"wing_{b.id}")
+                    binding_e = st.text_input("제본 방식(수정)", b.binding or "")
+                inner_spec_e = st.text_area("내지 사양(수정)", b.inner_spec or "", key=f"inner_{b.id}")
+
+                ec1, ec2 = st.columns(2)
+                with ec1:
+                    if st.form_submit_button("💾 저장"):
+                        update_book(b.id, {
+                            "title": title_e.strip(),
+                            "format": format_e.strip(),
+                            "cover_paper": cover_paper_e.strip(),
+                            "cover_color": cover_color_e.strip(),
+                            "inner_spec": inner_spec_e.strip(),
+                            "total_pages": int(total_pages_e),
+                            "endpaper": endpaper_e,
+                            "wing": wing_e,
+                            "binding": binding_e.strip(),
+                        })
+                        st.success("수정되었습니다.")
+                        _set_book_edit(None)
+                        st.rerun()
+                with ec2:
+                    st.form_submit_button("취소", on_click=_set_book_edit, args=(None,))
 
-            if st.session_state.get("edit_mode") and st.session_state.get("edit_id") == b.id:
-                with st.form(f"edit_form_{b.id}"):
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        title_e = st.text_input("도서명(수정)", b.title)
-                        format_e = st.text_input("판형(수정)", b.format or "")
-                        cover_paper_e = st.text_input("표지 용지(수정)", b.cover_paper or "")
-                        cover_color_e = st.text_input("표지 도수/양단면(수정)", b.cover_color or "")
-                    with col2:
-                        total_pages_e = st.number_input("총 페이지 수(수정)", min_value=0, step=1, value=int(b.total_pages or 0))
-                        endpaper_e = st.selectbox("면지 여부(수정)", ["없음","있음"], index=(0 if (b.endpaper or "없음")=="없음" else 1), key=f"endpaper_{b.id}")
-                        wing_e = st.selectbox("날개 여부(수정)", ["없음","있음"], index=(0 if (b.wing or "없음")=="없음" else 1), key=f"wing_{b.id}")
-                        binding_e = st.text_input("제본 방식(수정)", b.binding or "")
-                    inner_spec_e = st.text_area("내지 사양(수정)", b.inner_spec or "", key=f"inner_{b.id}")
-
-                    ec1, ec2 = st.columns(2)
-                    with ec1:
-                        if st.form_submit_button("💾 저장"):
-                            update_book(b.id, {
-                                "title": title_e.strip(),
-                                "format": format_e.strip(),
-                                "cover_paper": cover_paper_e.strip(),
-                                "cover_color": cover_color_e.strip(),
-                                "inner_spec": inner_spec_e.strip(),
-                                "total_pages": int(total_pages_e),
-                                "endpaper": endpaper_e,
-                                "wing": wing_e,
-                                "binding": binding_e.strip(),
-                            })
-                            st.success("수정되었습니다.")
-                            st.session_state["edit_mode"] = False
-                            st.session_state["edit_id"] = None
-                            st.rerun()
-                    with ec2:
-                        if st.form_submit_button("취소"):
-                            st.session_state["edit_mode"] = False
-                            st.session_state["edit_id"] = None
-                            st.rerun()
+# =========================================================
+# 페이지 4) 🔎 통합 검색
+#   - 메모/제작처/도서명/내지 사양/제본 전체 검색 (순위 + 페이지)
+# =========================================================
+def render_search_page():
+    st.header("🔎 통합 검색")
+
+    q = st.text_input(
+        "검색어 (메모 · 제작처 · 도서명 · 내지 사양 · 제본, 공백으로 여러 단어)",
+        key="global_search_q",
+        on_change=lambda: st.session_state.update(global_search_page=1),
+    )
+    if not (q or "").strip():
+        st.caption("예: `재인쇄 인쇄소A` → 메모에 '재인쇄', 제작처에 '인쇄소A'가 함께 있는 발주")
+        return
+
+    page = int(st.session_state.get("global_search_page", 1))
+    hits, total = search_all(q, page=page)
+    pages = max(1, -(-total // SEARCH_PAGE_SIZE))
+    if page > pages:
+        page = pages
+        st.session_state["global_search_page"] = page
+        hits, total = search_all(q, page=page)
+
+    st.caption(f"검색 결과 {total:,}건 · {page}/{pages} 페이지")
+    if not hits:
+        st.info("검색 결과가 없습니다.")
+        return
+
+    # 현재 페이지의 발주만 조회(발주일/부수 표시용)
+    order_ids = [h["ref_id"] for h in hits if h["kind"] == "order"]
+    # (모델, id)로 구분 — 진행 중 발주가 우선, 없으면 보관분
+    orders_by_key = {}
+    if order_ids:
+        s = get_session()
+        try:
+            for model in (Order, OrderArchive):
+                orders_by_key.update({
+                    (model, o.id): o for o in s.query(model).filter(model.id.in_(order_ids)).all()
+                })
+        finally:
+            s.close()
+
+    for h in hits:
+        if h["kind"] == "order":
+            o = orders_by_key.get((Order, h["ref_id"])) or orders_by_key.get((OrderArchive, h["ref_id"]))
+            head = f"📄 발주 · {h['title'] or '(삭제된 도서)'}"
+            if o:
+                head += f" · {o.date} · {o.qty}부"
+                if isinstance(o, OrderArchive):
+                    head += " · 🗄️ 보관"
+            st.markdown(f"**{head}**")
+            st.write(f"• 제작처: {h['vendor'] or '—'}")
+            if h["memo"]:
+                st.write(f"• 메모: {h['memo']}")
+        else:
+            st.markdown(f"**📘 도서 · {h['title']}**")
+            if h["spec"]:
+                st.write(f"• 사양: {h['spec']}")
+        st.markdown("---")
+
+    if pages > 1:
+        st.number_input("페이지", min_value=1, max_value=pages, step=1, key="global_search_page")
+
+# =========================================================
+# 페이지 5) 📄 발주서 일괄 생성
+#   - 제작처 + 발주일 범위(기본: 이번 주)의 발주서를 한 번에 만들어 zip으로 내려받기
+# =========================================================
+def render_purchase_order_page():
+    st.header("📄 발주서 일괄 생성")
+
+    vendors = get_vendors()
+    today = date.today()
+    week_start = today - timedelta(days=today.weekday())
+    c1, c2, c3 = st.columns([1, 1, 1])
+    with c1:
+        vendor = st.selectbox("제작처", ["(전체)"] + vendors, key="po_vendor")
+    with c2:
+        date_range = st.date_input("발주일 범위", value=(week_start, week_start + timedelta(days=6)),
+                                   key="po_date_range")
+    with c3:
+        fmt = st.radio("형식", ["html", "pdf"] if purchase_order.PDF_AVAILABLE else ["html"],
+                       horizontal=True, key="po_format")
+
+    date_from = date_range[0] if len(date_range) > 0 else None
+    date_to = date_range[1] if len(date_range) > 1 else date_from
+    rows = get_orders_with_books(None if vendor == "(전체)" else vendor, date_from, date_to)
+    st.caption(f"대상 발주 {len(rows):,}건")
+    if not rows:
+        return
+
+    if st.button("📄 발주서 만들기", key="po_batch_btn"):
+        payloads = [purchase_order.make_payload(o, b) for o, b in rows]
+        try:
+            with st.spinner("발주서 생성 중..."):
+                docs = purchase_order.render_batch(payloads, fmt=fmt)
+        except RuntimeError as e:
+            st.error(str(e))
+            return
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+            for payload, path in docs:
+                zf.write(path, purchase_order.document_name(payload, fmt))
+        st.success(f"{len(docs)}건 생성 완료")
+        st.download_button(
+            "⬇️ zip 내려받기", buf.getvalue(),
+            file_name=f"발주서_{vendor}_{date_from}_{date_to}.zip",
+            mime="application/zip", key="po_batch_dl",
+        )
 
 # =========================================================
 # 사이드바 네비게이션 / 라우팅
 # =========================================================
+api_status = ""
+if API_TOKEN:
+    try:
+        start_api_server(API_HOST, API_PORT, API_TOKEN).bind(
+            get_data_version=get_data_version,
+            get_books=get_books, count_books=count_books,
+            get_orders_with_books=get_orders_with_books, count_orders=count_orders,
+        )
+        api_status = f"🔗 API: http://{API_HOST}:{API_PORT}/api/"
+    except OSError as e:
+        api_status = f"⚠️ API 시작 실패: {e}"
+
+# 🔐 API까지 띄운 뒤 UI만 비밀번호로 제한 (API는 자체 토큰 검사)
+if not st.session_state.authenticated:
+    _login_form()
+    st.stop()
+
+for kind, args in _db_messages:
+    getattr(st, kind)(*args)
+
 with st.sidebar:
     st.markdown("## 메뉴")
     page = st.radio(
         "페이지 선택",
-        ["🔍 발주 조회", "📦 발주 입력", "📘 도서 사양 등록"],
+        ["🔍 발주 조회", "📦 발주 입력", "📘 도서 사양 등록", "🔎 통합 검색", "📄 발주서"],
         index=0,
         key="sidebar_nav",
     )
     st.markdown("---")
+    render_db_breaker_status()
+    with st.expander("🗄️ 연도 마감(보관)", expanded=False):
+        closable = [y for y in get_order_years() if y < date.today().year]
+        if closable:
+            year_to_close = st.selectbox("보관할 연도", closable, key="archive_year_select")
+            st.caption("보관된 발주는 조회·검색만 가능하고 되돌릴 수 없습니다.")
+            sure = st.checkbox(f"{year_to_close}년 발주를 보관 테이블로 옮깁니다", key="archive_confirm")
+            if st.button("보관 테이블로 이동", key="archive_year_btn", disabled=not sure):
+                moved = archive_year(year_to_close)
+                st.success(f"{year_to_close}년 발주 {moved}건을 보관했습니다.")
+                st.rerun()
+        else:
+            st.caption("보관할 지난 연도 발주가 없습니다.")
+        archived_years = get_order_years(archived=True)
+        if archived_years:
+            st.caption("보관됨: " + ", ".join(f"{y}년" for y in archived_years))
+    with st.expander("💾 백업 / 복원", expanded=False):
+        if st.button("지금 백업", key="backup_now_btn"):
+            try:
+                path = create_backup(engine)
+                st.success(f"백업 완료: {os.path.basename(path)}")
+            except (BackupError, OSError) as e:
+                st.error(f"백업 실패: {e}")
+        snaps = list_backups()
+        if snaps:
+            snap_name = st.selectbox(
+                "복원할 스냅샷", [b["name"] for b in snaps], key="restore_select",
+                format_func=lambda n: f"{n} ({next(b['size'] for b in snaps if b['name'] == n) / 1024:,.0f} KB)",
+            )
+            sure = st.checkbox("현재 데이터를 이 스냅샷으로 덮어씁니다", key="restore_confirm")
+            if st.button("복원", key="restore_btn", disabled=not sure):
+                try:
+                    safety = restore_backup(engine, next(b["path"] for b in snaps if b["name"] == snap_name))
+                    ensure_schema.clear()   # 복원된 DB 기준으로 다시 확인
+                    st.success(f"복원 완료 (복원 전 상태: {os.path.basename(safety)})")
+                    st.rerun()
+                except (BackupError, OSError) as e:
+                    st.error(f"복원 실패: {e}")
+        else:
+            st.caption("아직 백업이 없습니다.")
+    if api_status:
+        st.caption(api_status)
     st.caption("옵셋 도서 제작 관리 · v2 (Supabase/SQLite)")
 
 if page == "🔍 발주 조회":
     render_order_query_page()
 elif page == "📦 발주 입력":
     render_order_input_page()
+elif page == "🔎 통합 검색":
+    render_search_page()
+elif page == "📄 발주서":
+    render_purchase_order_page()
 else:
     render_book_spec_page()
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+데이터 백업 / 복원
+
+- SQLite: 온라인 백업 API(sqlite3.Connection.backup)로 작은 페이지 단위씩 복사
+  → 다른 세션의 쓰기를 막지 않음. 복사본 무결성 검사 후 gzip 압축 + SHA-256 체크섬
+- Postgres: books / orders / orders_archive 를 서버 측 커서로 나눠 읽어
+  gzip JSON Lines 논리 덤프로 스트리밍. 복원 시 검색 인덱스도 같은 트랜잭션에서 재구성
+  → 실행 중인 앱을 재시작하지 않아도 통합 검색에 바로 반영
+- 보관 개수(retention)를 넘는 오래된 스냅샷은 자동 삭제
+
+  python backup.py create                 # data/app.db 백업
+  python backup.py list
+  python backup.py restore data/backups/app-20250101-120000.db.gz
+  python backup.py create --url postgresql+psycopg2://user:pw@host:6543/postgres
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import uuid
+from datetime import date, datetime
+
+from sqlalchemy import create_engine, text
+
+from search_index import has_search_index, rebuild_search_index
+
+BACKUP_DIR = os.path.join("data", "backups")
+DEFAULT_KEEP = 14             # 보관할 스냅샷 수
+SQLITE_STEP_PAGES = 256       # 백업 한 단계에서 복사할 페이지 수
+SQLITE_STEP_SLEEP = 0.005     # 단계 사이 대기(초) → 그 사이 쓰기 가능
+PG_TABLES = ["books", "orders", "orders_archive"]
+PG_CHUNK_ROWS = 1000
+
+class BackupError(Exception):
+    pass
+
+# =========================================================
+# 공용
+# =========================================================
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _write_checksum(path: str):
+    # `sha256sum -c <파일>.sha256` 으로도 검증 가능한 형식
+    with open(path + ".sha256", "w", encoding="utf-8") as f:
+        f.write(f"{_sha256(path)}  {os.path.basename(path)}\n")
+
+def verify_backup(path: str) -> bool:
+    try:
+        with open(path + ".sha256", encoding="utf-8") as f:
+            expected = f.read().split()[0]
+    except (OSError, IndexError):
+        return False
+    return _sha256(path) == expected
+
+def _snapshot_name(prefix: str, ext: str, label: str = "") -> str:
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return f"{prefix}-{stamp}{'-' + label if label else ''}{ext}"
+
+def list_backups(backup_dir: str = BACKUP_DIR) -> list[dict]:
+    """최신순 스냅샷 목록 [{name, path, size, created}]"""
+    if not os.path.isdir(backup_dir):
+        return []
+    out = []
+    for name in os.listdir(backup_dir):
+        if not name.endswith((".db.gz", ".jsonl.gz")):
+            continue
+        path = os.path.join(backup_dir, name)
+        st_ = os.stat(path)
+        out.append({
+            "name": name, "path": path, "size": st_.st_size,
+            "created": datetime.fromtimestamp(st_.st_mtime),
+        })
+    return sorted(out, key=lambda b: (b["created"], b["name"]), reverse=True)
+
+def prune_backups(backup_dir: str = BACKUP_DIR, keep: int = DEFAULT_KEEP) -> list[str]:
+    """최신 keep개(엔진별)만 남기고 삭제한 파일 이름 반환"""
+    removed = []
+    for ext in (".db.gz", ".jsonl.gz"):
+        snaps = [b for b in list_backups(backup_dir) if b["name"].endswith(ext)]
+        for b in snaps[keep:]:
+            for p in (b["path"], b["path"] + ".sha256"):
+                if os.path.exists(p):
+                    os.remove(p)
+            removed.append(b["name"])
+    return removed
+
+def create_backup(engine, backup_dir: str = BACKUP_DIR, keep: int = DEFAULT_KEEP, label: str = "") -> str:
+    """스냅샷 생성 → 경로 반환 (생성 후 보관 개수 초과분 정리)"""
+    os.makedirs(backup_dir, exist_ok=True)
+    if engine.dialect.name.lower() == "postgresql":
+        path = _backup_pg(engine, backup_dir, label)
+    else:
+        path = _backup_sqlite(engine, backup_dir, label)
+    _write_checksum(path)
+    prune_backups(backup_dir, keep)
+    return path
+
+def restore_backup(engine, path: str, backup_dir: str = BACKUP_DIR) -> str | None:
+    """체크섬 확인 후 복원. 복원 직전 현재 상태를 pre-restore 스냅샷으로 남기고 그 경로 반환."""
+    if not verify_backup(path):
+        raise BackupError(f"체크섬 불일치 또는 .sha256 없음: {path}")
+    is_pg = engine.dialect.name.lower() == "postgresql"
+    if path.endswith(".jsonl.gz") != is_pg:
+        raise BackupError("현재 DB 종류와 백업 형식이 다릅니다.")
+
+    # 복원 대상 스냅샷이 정리되지 않도록 keep 제한 없이 안전 스냅샷 생성
+    safety = create_backup(engine, backup_dir, keep=len(list_backups(backup_dir)) + 1, label="pre-restore")
+    if is_pg:
+        _restore_pg(engine, path)
+    else:
+        _restore_sqlite(engine, path)
+    _touch_data_version(engine)
+    return safety
+
+def _touch_data_version(engine):
+    # 앱의 데이터 버전(API ETag) 갱신 → 복원 전 응답이 304로 재사용되지 않도록
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE app_meta SET value = :v WHERE key = 'data_version'"
+            ), {"v": uuid.uuid4().hex})
+    except Exception:
+        pass   # 앱이 한 번도 실행되지 않은 DB
+
+# =========================================================
+# SQLite: 온라인 백업 API
+# =========================================================
+def _sqlite_path(engine) -> str:
+    db = engine.url.database
+    if not db or db == ":memory:":
+        raise BackupError("파일 기반 SQLite만 백업할 수 있습니다.")
+    return db
+
+def _backup_sqlite(engine, backup_dir: str, label: str) -> str:
+    path = os.path.join(backup_dir, _snapshot_name("app", ".db.gz", label))
+    fd, tmp = tempfile.mkstemp(suffix=".db", dir=backup_dir)
+    os.close(fd)
+    try:
+        src = sqlite3.connect(_sqlite_path(engine))
+        dst = sqlite3.connect(tmp)
+        try:
+            src.backup(dst, pages=SQLITE_STEP_PAGES, sleep=SQLITE_STEP_SLEEP)
+            ok = dst.execute("PRAGMA integrity_check").fetchone()[0]
+            if ok != "ok":
+                raise BackupError(f"백업본 무결성 검사 실패: {ok}")
+        finally:
+            dst.close()
+            src.close()
+        with open(tmp, "rb") as f_in, gzip.open(path, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out, 1 << 20)
+    finally:
+        os.remove(tmp)
+    return path
+
+def _restore_sqlite(engine, path: str):
+    fd, tmp = tempfile.mkstemp(suffix=".db", dir=os.path.dirname(path) or ".")
+    os.close(fd)
+    try:
+        with gzip.open(path, "rb") as f_in, open(tmp, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out, 1 << 20)
+        src = sqlite3.connect(tmp)
+        # 파일 교체 대신 백업 API로 덮어씀 → 열린 연결도 복원된 내용을 보게 됨
+        dst = sqlite3.connect(_sqlite_path(engine))
+        try:
+            ok = src.execute("PRAGMA integrity_check").fetchone()[0]
+            if ok != "ok":
+                raise BackupError(f"백업본 무결성 검사 실패: {ok}")
+            src.backup(dst, pages=SQLITE_STEP_PAGES, sleep=SQLITE_STEP_SLEEP)
+        finally:
+            dst.close()
+            src.close()
+    finally:
+        os.remove(tmp)
+    engine.dispose()
+
+# =========================================================
+# Postgres: 청크 단위 논리 덤프 (gzip JSON Lines)
+#   {"format": "bookk-dump", ...}
+#   {"table": "books", "columns": [...]}
+#   [row], [row], ...
+# =========================================================
+def _json_default(v):
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    raise TypeError(f"직렬화 불가: {type(v)}")
+
+def _backup_pg(engine, backup_dir: str, label: str) -> str:
+    path = os.path.join(backup_dir, _snapshot_name("pg", ".jsonl.gz", label))
+    tmp = path + ".part"
+    try:
+        # REPEATABLE READ: 여러 테이블을 같은 시점 기준으로 덤프
+        with engine.connect().execution_options(
+            isolation_level="REPEATABLE READ", stream_results=True,
+        ) as conn, gzip.open(tmp, "wt", encoding="utf-8") as out:
+            out.write(json.dumps({"format": "bookk-dump", "version": 1,
+                                  "created": datetime.now().isoformat()}) + "\n")
+            for table in PG_TABLES:
+                result = conn.execute(text(f"SELECT * FROM {table} ORDER BY id"))
+                out.write(json.dumps({"table": table, "columns": list(result.keys())},
+                                     ensure_ascii=False) + "\n")
+                while True:
+                    rows = result.fetchmany(PG_CHUNK_ROWS)
+                    if not rows:
+                        break
+                    for r in rows:
+                        out.write(json.dumps(list(r), ensure_ascii=False, default=_json_default) + "\n")
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+def _read_pg_dump(path: str):
+    """(table, columns, rows 청크) 순서로 반환"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("format") != "bookk-dump":
+            raise BackupError("bookk 덤프 형식이 아닙니다.")
+        table, columns, chunk = None, None, []
+        for line in f:
+            item = json.loads(line)
+            if isinstance(item, dict):
+                if table and chunk:
+                    yield table, columns, chunk
+                table, columns, chunk = item["table"], item["columns"], []
+                continue
+            chunk.append(item)
+            if len(chunk) >= PG_CHUNK_ROWS:
+                yield table, columns, chunk
+                chunk = []
+        if table and chunk:
+            yield table, columns, chunk
+
+def _restore_pg(engine, path: str):
+    with engine.begin() as conn:
+        conn.execute(text(f"TRUNCATE {', '.join(PG_TABLES)}"))
+        for table, columns, rows in _read_pg_dump(path):
+            if table == "orders_archive":
+                # 연도별 파티션 먼저 생성
+                di = columns.index("date")
+                for year in sorted({int(str(r[di])[:4]) for r in rows}):
+                    conn.execute(text(
+                        f"CREATE TABLE IF NOT EXISTS orders_archive_{year} PARTITION OF orders_archive "
+                        f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+                    ))
+            stmt = text(
+                f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join(':' + c for c in columns)})"
+            )
+            conn.execute(stmt, [dict(zip(columns, r)) for r in rows])
+        # 다음 id = 최대 id + 1. 발주는 보관분까지 포함(보관된 id를 새 발주가 재사용하지 않도록),
+        # 비어 있으면 1부터 (is_called = false)
+        for table, ids in (("books", "SELECT id FROM books"),
+                           ("orders", "SELECT id FROM orders UNION ALL SELECT id FROM orders_archive")):
+            conn.execute(text(f"""
+                SELECT setval(pg_get_serial_sequence('{table}', 'id'), greatest(n, 1), n > 0)
+                FROM (SELECT coalesce(max(id), 0) AS n FROM ({ids}) AS t) AS m
+            """))
+        # 앱이 한 번도 실행되지 않은 DB에는 인덱스 테이블이 없음 → 앱 첫 실행 때 채워짐
+        if has_search_index(conn):
+            rebuild_search_index(conn)
+
+# =========================================================
+# CLI
+# =========================================================
+def main():
+    p = argparse.ArgumentParser(description="옵셋 도서 제작 관리 DB 백업/복원")
+    p.add_argument("--url", default=os.environ.get("DATABASE_URL", "sqlite:///data/app.db"),
+                   help="SQLAlchemy DB URL (기본: sqlite:///data/app.db 또는 $DATABASE_URL)")
+    p.add_argument("--dir", default=BACKUP_DIR, help="백업 폴더")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("create", help="스냅샷 생성")
+    c.add_argument("--keep", type=int, default=DEFAULT_KEEP)
+    c.add_argument("--label", default="")
+    sub.add_parser("list", help="스냅샷 목록")
+    r = sub.add_parser("restore", help="스냅샷 복원")
+    r.add_argument("path")
+    v = sub.add_parser("verify", help="체크섬 검증")
+    v.add_argument("path")
+    pr = sub.add_parser("prune", help="오래된 스냅샷 정리")
+    pr.add_argument("--keep", type=int, default=DEFAULT_KEEP)
+    args = p.parse_args()
+
+    if args.cmd == "list":
+        for b in list_backups(args.dir):
+            ok = "ok" if verify_backup(b["path"]) else "CHECKSUM?"
+            print(f"{b['name']}\t{b['size']:,} bytes\t{ok}")
+    elif args.cmd == "verify":
+        ok = verify_backup(args.path)
+        print("ok" if ok else "checksum mismatch")
+        raise SystemExit(0 if ok else 1)
+    elif args.cmd == "prune":
+        for name in prune_backups(args.dir, args.keep):
+            print(f"removed {name}")
+    else:
+        engine = create_engine(args.url)
+        if args.cmd == "create":
+            print(create_backup(engine, args.dir, args.keep, args.label))
+        else:
+            safety = restore_backup(engine, args.path, args.dir)
+            print(f"restored {args.path} (복원 전 상태: {safety})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+동시 접속 부하 테스트 (streamlit.testing AppTest)
+
+app.py를 헤드리스로 실행하는 가상 세션 여러 개를 동시에 돌리며
+실제 사용 흐름(로그인 → 도서 검색 → 발주 조회 → 변경 저장 → 발주 입력 → 통합 검색)을
+반복하고, 동작별 p50/p95/p99 지연시간과 오류율을 출력합니다.
+
+  # 로컬 SQLite (임시 폴더에 새 DB)
+  python loadtest.py --sessions 8 --iterations 5
+
+  # 로컬 Postgres (docker run -e POSTGRES_PASSWORD=postgres -p 5432:5432 postgres)
+  python loadtest.py --backend postgres --pg-host localhost --pg-pass postgres
+
+  # 둘 다
+  python loadtest.py --backend both
+
+AppTest는 프로세스 전역 상태(Runtime, st.secrets)를 공유하므로 한 프로세스 안의
+스레드로는 세션을 동시에 돌릴 수 없습니다. 세션마다 별도 워커 프로세스를 사용합니다.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+PASSWORD = "loadtest"
+
+PAGE_QUERY = "🔍 발주 조회"
+PAGE_INPUT = "📦 발주 입력"
+PAGE_BOOKS = "📘 도서 사양 등록"
+PAGE_SEARCH = "🔎 통합 검색"
+
+ACTIONS = ["login", "search_book", "page_orders", "save_edits", "enter_order", "global_search"]
+
+BOOK_WORDS = ["어린왕자", "데미안", "노인과 바다", "동물농장", "변신", "이방인", "페스트", "수레바퀴 아래서"]
+VENDORS = ["인쇄소가나", "다라인쇄", "마바사프린팅", "아자제본"]
+
+
+class LoadTestError(Exception):
+    """스크립트 실행 중 앱 예외/기대 요소 누락"""
+
+
+def _by_label(elements, label: str):
+    for el in elements:
+        if el.label == label:
+            return el
+    raise LoadTestError(f"요소 없음: {label}")
+
+
+class Session:
+    """AppTest 한 개 = 브라우저 탭 한 개"""
+
+    def __init__(self, secrets: dict, timeout: float):
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        for k, v in secrets.items():
+            self.at.secrets[k] = v
+
+    def _run(self, el=None):
+        (el or self.at).run()
+        if self.at.exception:
+            raise LoadTestError(self.at.exception[0].message)
+
+    def _goto(self, page: str):
+        radio = self.at.sidebar.radio(key="sidebar_nav")
+        if radio.value != page:
+            radio.set_value(page)
+            self._run()
+
+    # ---- 동작 ----
+    def login(self):
+        self._run()
+        self.at.text_input(key="pw_input").input(PASSWORD)
+        self._run(self.at.button(key="login_btn").click())
+
+    def dialect(self) -> str:
+        for c in self.at.caption:
+            if str(c.value).startswith("🔎 dialect = "):
+                return str(c.value).split("=", 1)[1].strip()
+        return ""
+
+    def search_book(self):
+        self._goto(PAGE_QUERY)
+        self.at.text_input(key="query_search_title").input(random.choice(BOOK_WORDS)[:2])
+        self._run()
+        try:
+            books = self.at.selectbox(key="query_book_select")
+        except KeyError:
+            return  # 검색 결과 없음(정상 화면)
+        self._run(books.select_index(random.randrange(len(books.options))))
+
+    def page_orders(self):
+        self._goto(PAGE_QUERY)
+        try:
+            self.at.date_input(key="query_date_range")
+        except KeyError:
+            # 직전 도서 검색 결과가 없던 경우 → 검색어 지우고 전체 목록
+            self.at.text_input(key="query_search_title").input("")
+            self._run()
+        start = date.today() - timedelta(days=random.randint(0, 365))
+        self.at.date_input(key="query_date_range").set_value((start, start + timedelta(days=30)))
+        self._run()
+        self.at.date_input(key="query_date_range").set_value(())
+        self._run()
+
+    def save_edits(self):
+        self._goto(PAGE_QUERY)
+        try:
+            self.at.button(key="order_invoice_save")
+        except KeyError:
+            return  # 선택한 도서에 발주가 없음
+        self.at.session_state["order_invoice_editor"] = {
+            "edited_rows": {0: {"메모": f"부하테스트 {random.randint(0, 9999)}"}},
+            "added_rows": [], "deleted_rows": [],
+        }
+        self._run(self.at.button(key="order_invoice_save").click())
+
+    def enter_order(self):
+        self._goto(PAGE_INPUT)
+        books = self.at.selectbox(key="order_book_select")
+        books.select_index(random.randrange(len(books.options)))
+        self._run()
+        _by_label(self.at.number_input, "권당 가격").set_value(random.choice([1200, 1500, 2100]))
+        _by_label(self.at.text_input, "제작처").input(random.choice(VENDORS))
+        self._run(_by_label(self.at.button, "📝 발주 저장").click())
+
+    def global_search(self):
+        self._goto(PAGE_SEARCH)
+        self.at.text_input(key="global_search_q").input(f"{random.choice(VENDORS)} 부하")
+        self._run()
+
+    def add_book(self, title: str):
+        self._goto(PAGE_BOOKS)
+        _by_label(self.at.text_input, "도서명").input(title)
+        self._run(_by_label(self.at.button, "➕ 도서 추가").click())
+
+
+def _timed(results: list, name: str, fn):
+    t0 = time.perf_counter()
+    try:
+        fn()
+        err = None
+    except Exception as e:
+        err = f"{type(e).__name__}: {e}".splitlines()[0][:200]
+    results.append((name, time.perf_counter() - t0, err))
+    return err is None
+
+
+def run_session(secrets: dict, iterations: int, think: float, timeout: float, seed: int) -> list:
+    """워커 프로세스: 세션 1개의 시나리오 반복 → [(동작, 초, 오류 메시지|None)]"""
+    random.seed(seed)
+    results = []
+    s = Session(secrets, timeout)
+    if not _timed(results, "login", s.login):
+        return results
+    for _ in range(iterations):
+        for name in ACTIONS[1:]:
+            _timed(results, name, getattr(s, name))
+            if think:
+                time.sleep(random.uniform(0, think))
+    return results
+
+
+def seed_data(secrets: dict, books: int, timeout: float) -> str:
+    """도서/발주 초기 데이터 등록. 실제 연결된 dialect 반환."""
+    s = Session(secrets, timeout)
+    s.login()
+    for i in range(books):
+        s.add_book(f"{BOOK_WORDS[i % len(BOOK_WORDS)]} {i + 1}")
+    for _ in range(books):
+        s.enter_order()
+    return s.dialect()
+
+
+def percentile(sorted_vals: list, p: float) -> float:
+    if len(sorted_vals) == 1:
+        return sorted_vals[0]
+    return statistics.quantiles(sorted_vals, n=100, method="inclusive")[int(p) - 1]
+
+
+def report(label: str, results: list, wall: float):
+    print(f"\n=== {label} · {len(results)}건 · {wall:.1f}s ===")
+    print(f"{'action':<14}{'n':>6}{'err%':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for name in ACTIONS:
+        rows = [r for r in results if r[0] == name]
+        if not rows:
+            continue
+        lat = sorted(r[1] * 1000 for r in rows)
+        err = 100.0 * sum(1 for r in rows if r[2]) / len(rows)
+        print(f"{name:<14}{len(rows):>6}{err:>8.1f}"
+              f"{percentile(lat, 50):>10.0f}{percentile(lat, 95):>10.0f}{percentile(lat, 99):>10.0f}")
+    errors = sorted({f"{r[0]}: {r[2]}" for r in results if r[2]})
+    for e in errors[:10]:
+        print(f"  ! {e}")
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    # AppTest 실행 후에는 sys.modules["__main__"]가 앱 스크립트로 바뀌므로
+    # 부모 프로세스에서는 AppTest를 돌리지 않고, 워커는 작업 1개마다 새로 띄운다.
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=mp.get_context("spawn"), max_tasks_per_child=1,
+    )
+
+
+def run_backend(label: str, secrets: dict, args):
+    if not args.no_seed:
+        with _pool(1) as pool:
+            dialect = pool.submit(seed_data, secrets, args.books, args.timeout).result()
+        expected = "postgresql" if label == "postgres" else "sqlite"
+        if dialect != expected:
+            print(f"[{label}] 연결된 DB가 {dialect or '알 수 없음'} 입니다(기대: {expected}). 건너뜁니다.")
+            return
+
+    t0 = time.perf_counter()
+    results = []
+    with _pool(args.sessions) as pool:
+        futures = [
+            pool.submit(run_session, secrets, args.iterations, args.think, args.timeout, args.seed + i)
+            for i in range(args.sessions)
+        ]
+        for f in futures:
+            results.extend(f.result())
+    report(f"{label} · 세션 {args.sessions}개", results, time.perf_counter() - t0)
+
+
+def main():
+    p = argparse.ArgumentParser(description="app.py 동시 접속 부하 테스트")
+    p.add_argument("--backend", choices=["sqlite", "postgres", "both"], default="sqlite")
+    p.add_argument("--sessions", type=int, default=8, help="동시 세션 수(워커 프로세스 수)")
+    p.add_argument("--iterations", type=int, default=5, help="세션당 시나리오 반복 횟수")
+    p.add_argument("--think", type=float, default=0.0, help="동작 사이 최대 대기(초)")
+    p.add_argument("--books", type=int, default=20, help="초기 등록 도서/발주 수")
+    p.add_argument("--no-seed", action="store_true", help="초기 데이터 등록 생략")
+    p.add_argument("--timeout", type=float, default=60.0, help="스크립트 1회 실행 제한(초)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--workdir", default=None, help="SQLite data/app.db를 둘 폴더(기본: 임시 폴더)")
+    p.add_argument("--pg-host", default="localhost")
+    p.add_argument("--pg-port", default="5432")
+    p.add_argument("--pg-user", default="postgres")
+    p.add_argument("--pg-pass", default="postgres")
+    p.add_argument("--pg-name", default="postgres")
+    p.add_argument("--pg-sslmode", default="disable")
+    args = p.parse_args()
+
+    # 앱은 cwd 기준 data/app.db를 사용 → 워커 프로세스도 같은 cwd를 물려받음
+    os.chdir(args.workdir or tempfile.mkdtemp(prefix="bookk-loadtest-"))
+    print(f"workdir: {os.getcwd()}")
+
+    if args.backend in ("sqlite", "both"):
+        run_backend("sqlite", {"APP_PASSWORD": PASSWORD}, args)
+    if args.backend in ("postgres", "both"):
+        run_backend("postgres", {
+            "APP_PASSWORD": PASSWORD,
+            "DB_HOST": args.pg_host, "DB_PORT": args.pg_port,
+            "DB_USER": args.pg_user, "DB_PASS": args.pg_pass,
+            "DB_NAME": args.pg_name, "DB_SSLMODE": args.pg_sslmode,
+        }, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+발주서(purchase order) 문서 생성
+
+- Order + Book → HTML 발주서 (weasyprint가 설치돼 있으면 PDF도)
+- 렌더링 결과는 발주 내용의 해시로 캐시 → 내용이 같으면 다시 만들지 않음
+  (최근 사용한 CACHE_KEEP개만 남기고 정리 → 수정 전 내용의 문서가 쌓이지 않음)
+- PDF 여러 건은 별도 프로세스(python purchase_order.py)의 풀에서 병렬 렌더링
+
+Streamlit에 의존하지 않는 모듈이라 워커 프로세스에서 가볍게 import 됩니다.
+
+  # stdin: make_payload() 결과의 JSON 배열
+  python purchase_order.py --format pdf < payloads.json
+"""
+import argparse
+import hashlib
+import html
+import json
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+try:
+    from weasyprint import HTML as _WeasyHTML   # 선택 의존성 (PDF)
+except ImportError:
+    _WeasyHTML = None
+
+PDF_AVAILABLE = _WeasyHTML is not None
+CACHE_DIR = os.path.join("data", "po_cache")
+TEMPLATE_VERSION = 1   # 양식을 바꾸면 올려서 캐시 무효화
+POOL_MIN_BATCH = 4     # PDF가 이 건수 이상일 때만 프로세스 풀 사용 (HTML은 건당 수 ms → 항상 인라인)
+CACHE_KEEP = 500       # 캐시에 남길 최근 사용 문서 수
+
+# 발주서에 찍히는 필드만 해시/렌더링 대상 (계산서 발행 여부 등은 제외)
+ORDER_FIELDS = [
+    "id", "book_id", "qty", "date", "vendor",
+    "supply_price", "vat_price", "total_price", "unit_price", "total_override", "memo",
+]
+BOOK_FIELDS = [
+    "title", "format", "cover_paper", "cover_color", "inner_spec",
+    "total_pages", "endpaper", "wing", "binding", "postprocess",
+]
+COST_SECTIONS = [
+    ("표지", [("CTP", "cover_ctp"), ("인쇄", "cover_print"), ("종이", "cover_paper")]),
+    ("본문1", [("CTP", "inner1_ctp"), ("인쇄", "inner1_print"), ("종이", "inner1_paper")]),
+    ("본문2", [("CTP", "inner2_ctp"), ("인쇄", "inner2_print"), ("종이", "inner2_paper")]),
+    ("면지 / 제본", [("면지", "endpaper"), ("제본", "binding")]),
+    ("후가공", [("라미네이팅", "laminating"), ("에폭시", "epoxy"), ("제판대", "plate"), ("필름", "film")]),
+    ("기타", [("공과잡비", "misc"), ("배송비", "delivery")]),
+]
+COST_FIELDS = [f"{key}_{kind}" for _, lines in COST_SECTIONS for _, key in lines for kind in ("unit", "cost")]
+
+def _plain(v):
+    return v.isoformat() if isinstance(v, (date, datetime)) else v
+
+def make_payload(order, book) -> dict:
+    """ORM 객체 → 피클 가능한 dict (프로세스 풀 전달/해시용)"""
+    return {
+        "order": {f: _plain(getattr(order, f, None)) for f in ORDER_FIELDS + COST_FIELDS},
+        "book": {f: _plain(getattr(book, f, None)) for f in BOOK_FIELDS} if book else {},
+    }
+
+def content_hash(payload: dict) -> str:
+    raw = json.dumps([TEMPLATE_VERSION, payload], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def document_name(payload: dict, ext: str = "html") -> str:
+    o = payload["order"]
+    vendor = "".join(ch for ch in (o.get("vendor") or "미정") if ch.isalnum())
+    return f"발주서_{o.get('date')}_{vendor}_{o.get('id')}.{ext}"
+
+# =========================================================
+# 렌더링
+# =========================================================
+def _won(v) -> str:
+    return f"{int(v or 0):,}"
+
+def render_html(payload: dict) -> str:
+    o, b = payload["order"], payload["book"]
+    e = lambda v: html.escape(str(v if v not in (None, "") else "—"))
+    total = o.get("total_override") or o.get("total_price") or 0
+
+    spec_rows = [
+        ("도서명", b.get("title")), ("판형", b.get("format")),
+        ("표지", f"{b.get('cover_paper') or ''} {b.get('cover_color') or ''}".strip()),
+        ("내지", b.get("inner_spec")), ("총 페이지", f"{b.get('total_pages') or 0}쪽"),
+        ("면지 / 날개", f"{b.get('endpaper') or '—'} / {b.get('wing') or '—'}"),
+        ("제본", b.get("binding")), ("후가공", b.get("postprocess")),
+    ]
+    cost_rows = []
+    for section, lines in COST_SECTIONS:
+        for label, key in lines:
+            unit, cost = o.get(f"{key}_unit") or 0, o.get(f"{key}_cost") or 0
+            if unit or cost:
+                cost_rows.append(
+                    f"<tr><td>{e(section)}</td><td>{e(label)}</td>"
+                    f"<td class='num'>{_won(unit)}</td><td class='num'>{_won(cost)}</td></tr>"
+                )
+    if o.get("unit_price"):
+        cost_rows.append(
+            f"<tr><td>권당 가격</td><td>{_won(o.get('qty'))}부 × {_won(o.get('unit_price'))}원</td>"
+            f"<td class='num'>{_won(o.get('unit_price'))}</td><td class='num'>{_won(o.get('supply_price'))}</td></tr>"
+        )
+
+    return f"""<!DOCTYPE html>
+<html lang="ko"><head><meta charset="utf-8">
+<title>발주서 #{e(o.get('id'))}</title>
+<style>
+  body {{ font-family: 'Malgun Gothic', 'Apple SD Gothic Neo', 'Noto Sans KR', sans-serif; margin: 24px; }}
+  h1 {{ text-align: center; letter-spacing: 0.5em; }}
+  table {{ width: 100%; border-collapse: collapse; margin: 12px 0; }}
+  th, td {{ border: 1px solid #444; padding: 6px 8px; font-size: 13px; }}
+  th {{ background: #f0f0f0; width: 18%; text-align: left; }}
+  .num {{ text-align: right; }}
+  .total td {{ font-weight: bold; }}
+</style></head><body>
+<h1>발주서</h1>
+<table>
+  <tr><th>발주번호</th><td>#{e(o.get('id'))}</td><th>발주일</th><td>{e(o.get('date'))}</td></tr>
+  <tr><th>제작처</th><td>{e(o.get('vendor'))}</td><th>제작 부수</th><td>{_won(o.get('qty'))}부</td></tr>
+</table>
+<h3>도서 사양</h3>
+<table>{''.join(f"<tr><th>{e(k)}</th><td>{e(v)}</td></tr>" for k, v in spec_rows)}</table>
+<h3>제작 비용</h3>
+<table>
+  <tr><th>구분</th><th>항목</th><th class='num'>단가</th><th class='num'>비용(원)</th></tr>
+  {''.join(cost_rows) or "<tr><td colspan='4'>—</td></tr>"}
+  <tr class='total'><td colspan='3'>공급가(VAT 제외)</td><td class='num'>{_won(o.get('supply_price'))}</td></tr>
+  <tr class='total'><td colspan='3'>부가세(10%)</td><td class='num'>{_won(o.get('vat_price'))}</td></tr>
+  <tr class='total'><td colspan='3'>총액(VAT 포함)</td><td class='num'>{_won(total)}</td></tr>
+</table>
+<h3>비고</h3>
+<p>{e(o.get('memo')).replace(chr(10), '<br>')}</p>
+</body></html>
+"""
+
+def render_pdf(html_text: str) -> bytes:
+    if not PDF_AVAILABLE:
+        raise RuntimeError("PDF 생성에는 weasyprint가 필요합니다 (pip install weasyprint).")
+    return _WeasyHTML(string=html_text).write_pdf()
+
+# =========================================================
+# 캐시
+# =========================================================
+def _cache_path(payload: dict, ext: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, f"{content_hash(payload)}.{ext}")
+
+def render_cached(payload: dict, fmt: str = "html", cache_dir: str = CACHE_DIR) -> str:
+    """캐시 경로 반환. 같은 내용으로 이미 만든 문서가 있으면 렌더링하지 않음."""
+    path = _cache_path(payload, fmt, cache_dir)
+    if os.path.exists(path):
+        _touch(path)
+        return path
+    os.makedirs(cache_dir, exist_ok=True)
+    doc = render_html(payload)
+    data = render_pdf(doc) if fmt == "pdf" else doc.encode("utf-8")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+def _touch(path: str):
+    # 캐시 적중 시 mtime 갱신 → prune_cache()가 최근 사용 순으로 남김
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def prune_cache(cache_dir: str = CACHE_DIR, keep: int = CACHE_KEEP) -> list[str]:
+    """최근 사용한 keep개만 남기고 삭제한 파일 이름 반환 (렌더링 중인 .tmp는 제외)"""
+    if not os.path.isdir(cache_dir):
+        return []
+    docs = [e for e in os.scandir(cache_dir) if e.is_file() and e.name.endswith((".html", ".pdf"))]
+    docs.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    removed = []
+    for e in docs[keep:]:
+        try:
+            os.remove(e.path)
+            removed.append(e.name)
+        except FileNotFoundError:
+            pass
+    return removed
+
+def _render_pool(payloads: list[dict], fmt: str, cache_dir: str, max_workers: int | None = None):
+    workers = max_workers or min(len(payloads), os.cpu_count() or 1, 4)
+    # 단독 프로세스에서만 호출 → spawn 워커가 이 모듈을 import해도 앱이 실행되지 않음
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+        list(pool.map(render_cached, payloads, [fmt] * len(payloads), [cache_dir] * len(payloads)))
+
+def _render_in_subprocess(payloads: list[dict], fmt: str, cache_dir: str, max_workers: int | None = None):
+    # 스레드가 여러 개 도는 Streamlit 서버 프로세스에서 fork하지 않도록 새 인터프리터에 위임
+    cmd = [sys.executable, os.path.abspath(__file__), "--format", fmt,
+           "--cache-dir", os.path.abspath(cache_dir)]
+    if max_workers:
+        cmd += ["--workers", str(max_workers)]
+    proc = subprocess.run(cmd, input=json.dumps(payloads, ensure_ascii=False).encode("utf-8"),
+                          capture_output=True)
+    if proc.returncode != 0:
+        err = proc.stderr.decode("utf-8", "replace").strip().splitlines()
+        raise RuntimeError(f"발주서 일괄 렌더링 실패: {err[-1] if err else proc.returncode}")
+
+def render_batch(payloads: list[dict], fmt: str = "html", cache_dir: str = CACHE_DIR,
+                 max_workers: int | None = None) -> list[tuple[dict, str]]:
+    """여러 발주서를 렌더링 → [(payload, 경로)]. 캐시에 없는 것만 생성.
+
+    HTML과 소량 PDF는 그 자리에서, PDF가 POOL_MIN_BATCH건 이상이면 별도 프로세스에서 병렬로.
+    """
+    paths = {i: _cache_path(p, fmt, cache_dir) for i, p in enumerate(payloads)}
+    missing = []
+    for i, path in paths.items():
+        if os.path.exists(path):
+            _touch(path)
+        else:
+            missing.append(payloads[i])
+    if fmt == "pdf" and len(missing) >= POOL_MIN_BATCH:
+        _render_in_subprocess(missing, fmt, cache_dir, max_workers)
+    else:
+        for p in missing:
+            render_cached(p, fmt, cache_dir)
+    # 이번 묶음은 모두 최근 사용이므로 정리 대상에서 빠짐
+    prune_cache(cache_dir, keep=max(CACHE_KEEP, len(payloads)))
+    return [(p, paths[i]) for i, p in enumerate(payloads)]
+
+def main():
+    ap = argparse.ArgumentParser(description="발주서 일괄 렌더링 (stdin: make_payload() 결과 JSON 배열)")
+    ap.add_argument("--format", choices=["html", "pdf"], default="pdf")
+    ap.add_argument("--cache-dir", default=CACHE_DIR)
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args()
+    payloads = json.load(sys.stdin)
+    if payloads:
+        _render_pool(payloads, args.format, args.cache_dir, args.workers)
+
+if __name__ == "__main__":
+    main()
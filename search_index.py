@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+통합 검색 인덱스 일괄 재구성 (app.py 초기 채우기 / backup.py 복원 공용)
+
+- 행 키(rowid) = ref_id*2 (+1: 발주) → app.py의 행 단위 동기화와 같은 규칙
+- 도서 / 발주 / 보관 발주를 INSERT ... SELECT 세 문장으로 채움
+  → 행마다 왕복하지 않아 원격 DB(Supabase)에서도 한 번에 끝남
+"""
+from sqlalchemy import inspect, text
+
+_COLUMNS = "rowid, kind, ref_id, book_id, title, vendor, memo, spec"
+
+def has_search_index(conn) -> bool:
+    return inspect(conn).has_table("search_index")
+
+def rebuild_search_index(conn):
+    """search_index를 비우고 books / orders / orders_archive 기준으로 다시 채움 (호출자 트랜잭션 안)"""
+    conn.execute(text("DELETE FROM search_index"))
+    conn.execute(text(f"""
+        INSERT INTO search_index ({_COLUMNS})
+        SELECT id * 2, 'book', id, id, coalesce(title, ''), '', '',
+               trim(coalesce(inner_spec, '') || ' ' || coalesce(binding, ''))
+        FROM books
+    """))
+    # 예전 SQLite DB에는 보관분과 id가 겹치는 발주가 있을 수 있음 → 진행 중 발주 우선
+    for table, where in (("orders", ""), ("orders_archive", "WHERE o.id NOT IN (SELECT id FROM orders)")):
+        conn.execute(text(f"""
+            INSERT INTO search_index ({_COLUMNS})
+            SELECT o.id * 2 + 1, 'order', o.id, o.book_id, coalesce(b.title, ''),
+                   coalesce(o.vendor, ''), coalesce(o.memo, ''), ''
+            FROM {table} o LEFT JOIN books b ON b.id = o.book_id
+            {where}
+        """))